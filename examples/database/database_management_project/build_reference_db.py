@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2023-2024 Achille MARTIN
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# ---- INTRODUCTION ----
+# Build of the read-only reference database bundled in the app package
+#
+# The reference database holds the static data of the app. It is built once
+# on the host (instead of running SQL on every device at first launch), as a
+# single self-contained file (rollback journal, vacuumed) so that the app can
+# open it with immutable=1. Run this script again after changing the data
+# and update the package content of the pdt (see utils/pdt_manifest.py).
+#
+# Usage example:
+# python3 build_reference_db.py
+
+import argparse
+import os
+import sqlite3
+import sys
+
+DEFAULT_OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        'database_management_pkg', 'reference.db')
+
+# Players copied into the tennismen table of a new user database
+PLAYERS = [
+    (101, 'Andre', 'Agassi', 'USA'),
+    (102, 'Novak', 'Djokovic', 'SRB'),
+    (103, 'Daniil', 'Medvedev', 'RUS'),
+    (104, 'Andy', 'Murray', 'GBR'),
+    (105, 'Rafael', 'Nadal', 'ESP'),
+    (106, 'Roger', 'Federer', 'SUI'),
+    (107, 'Pete', 'Sampras', 'USA'),
+    (108, 'Bjorn', 'Borg', 'SWE'),
+    (109, 'Carlos', 'Alcaraz', 'ESP'),
+    (110, 'Jannik', 'Sinner', 'ITA'),
+]
+
+COUNTRIES = [
+    ('ESP', 'Spain'),
+    ('GBR', 'Great Britain'),
+    ('ITA', 'Italy'),
+    ('RUS', 'Russia'),
+    ('SRB', 'Serbia'),
+    ('SUI', 'Switzerland'),
+    ('SWE', 'Sweden'),
+    ('USA', 'United States'),
+]
+
+
+def build_reference_db(output_path):
+    temporary_path = output_path + '.tmp'
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    connection = sqlite3.connect(temporary_path)
+    try:
+        # An immutable database must not rely on a WAL file
+        connection.execute("pragma journal_mode = delete")
+        connection.execute("create table countries(code varchar(3) primary key, name varchar(40))")
+        connection.execute("create table players(id int primary key, firstname varchar(20), "
+                "lastname varchar(20), country varchar(3) references countries(code))")
+        connection.execute("create index players_country_index on players (country)")
+        connection.executemany("insert into countries values (?, ?)", COUNTRIES)
+        connection.executemany("insert into players values (?, ?, ?, ?)", PLAYERS)
+        connection.commit()
+        connection.execute("vacuum")
+    finally:
+        connection.close()
+    os.replace(temporary_path, output_path)
+
+
+if __name__ == "__main__":
+    # Parse the command line.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output',
+            help=f"the reference database file [default: {DEFAULT_OUTPUT_PATH}]",
+            metavar="FILE",
+            default=DEFAULT_OUTPUT_PATH)
+    cmd_line_args = parser.parse_args()
+
+    try:
+        build_reference_db(cmd_line_args.output)
+    except Exception as e:
+        print("[ERROR] Cannot build the reference database")
+        print("Error message:\n" + str(e))
+        sys.exit(1)
+    print(f"[INFO] Reference database built at {cmd_line_args.output}")
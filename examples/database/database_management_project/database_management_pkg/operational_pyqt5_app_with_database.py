@@ -29,13 +29,16 @@
 
 ## Imports
 
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QMessageBox, QDialog, QTableView, QVBoxLayout, QWidget, QSizePolicy
+from PyQt5.QtCore import Qt, QDateTime, QTimer, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThread, QThreadPool, pyqtSignal, QFile, QUrl, QIODevice, QCryptographicHash
+from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QMessageBox, QDialog, QTableView, QVBoxLayout, QWidget, QSizePolicy, QLineEdit, QLabel, QAbstractItemView
 from PyQt5.QtSql import QSqlDatabase, QSqlTableModel, QSqlQuery
 
 import sys
 import os.path # To manage file paths for cross-platform apps
 import logging as log_tool # The logging library for debugging
+import csv # To import data into the database
+from collections import OrderedDict # To keep the least recently used pages of large tables
+import json # To journal the pending edits of the tables
 
 ## Main variables and objects
 
@@ -60,6 +63,128 @@ logger.addHandler(file_handler)
 
 ## Class definition
 
+# Number of rows above which a table is displayed through a PagedTableModel
+PAGED_MODEL_ROW_THRESHOLD = 10000
+
+# SQLite connection profiles: pragmas applied (in order) when a connection opens
+# and busy timeout (in ms) waited for locks held by other connections
+# Note: WAL lets readers and the writer work concurrently and turns every commit
+# into an append to the log file, so that OnFieldChange commits do not stall the UI
+CONNECTION_PROFILES = {
+    # SQLite defaults (rollback journal, full synchronisation)
+    'default': {
+        'busy_timeout': 0,
+        'pragmas': {},
+    },
+    # Responsive UI with durable commits (a power loss can only lose the last commits)
+    'interactive': {
+        'busy_timeout': 5000,
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'cache_size': -8000, # In KiB
+            'mmap_size': 64 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+        },
+    },
+    # Every commit is synchronised to disk, including with WAL
+    'durable': {
+        'busy_timeout': 5000,
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'FULL',
+        },
+    },
+    # Imports and batch jobs: a crash can corrupt the database
+    'bulk': {
+        'busy_timeout': 10000,
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'OFF',
+            'cache_size': -64000, # In KiB
+            'mmap_size': 256 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+        },
+    },
+}
+DEFAULT_CONNECTION_PROFILE = 'interactive'
+
+# Schema migrations, applied in order at startup to the databases whose `pragma user_version` is lower
+# than their version: the statements of all the pending migrations run in one transaction with the
+# version update, then the backfill of each migration (if any) updates the existing rows in batches
+# of increasing key, run from the event loop and resumed at the next startup if interrupted
+MIGRATIONS = [
+    {
+        'version': 1,
+        'statements': [
+            "create table if not exists tennismen(id int primary key, firstname varchar(20), lastname varchar(20))",
+        ],
+    },
+    {
+        'version': 2,
+        'statements': [
+            "alter table tennismen add column country varchar(3)",
+        ],
+        'backfill': {
+            'table': 'tennismen',
+            'key': 'id',
+            'assignments': "country = (select country from reference.players where players.id = tennismen.id)",
+            # Schema which must be attached to run the backfill (postponed otherwise)
+            'schema': 'reference',
+        },
+    },
+]
+# Number of rows updated per transaction by the backfills
+BACKFILL_BATCH_SIZE = 1000
+
+# Headers of the table columns displayed by the models (the other columns show their name)
+COLUMN_HEADERS = {
+    'id': "ID",
+    'firstname': "First name",
+    'lastname': "Last name",
+    'country': "Country",
+}
+
+# Columns of the tennismen table searched from the database dialog
+SEARCH_COLUMNS = ['firstname', 'lastname']
+# Summary tables kept up to date by triggers (see DbManager.create_aggregate): one row per group
+# of the grouping columns, with its row_count and measures (column: (function, source column))
+AGGREGATES = {
+    'tennismen_summary': {
+        'table': 'tennismen',
+        'group_by': [],
+        'measures': {},
+    },
+}
+# Aggregate functions which can be maintained row by row (min and max would need a rescan on delete)
+AGGREGATE_FUNCTIONS = ('count', 'sum')
+# Database name of the in-memory SQLite databases
+IN_MEMORY_DB_NAME = ':memory:'
+
+# Read-only reference database bundled in the app package (see build_reference_db.py),
+# attached to the user database under the schema name (e.g. `select * from reference.players`)
+REFERENCE_DB_NAME = 'reference.db'
+REFERENCE_DB_SCHEMA = 'reference'
+# The reference database is immutable: map it entirely instead of copying its pages in the page cache
+REFERENCE_DB_MMAP_SIZE = 256 * 1024 * 1024
+
+# Number of prepared statements kept per connection
+STATEMENT_CACHE_SIZE = 64
+
+# Delay (in ms) without typing before the search is run
+SEARCH_DEBOUNCE_DELAY = 250
+
+# Pending edits of the table editor are written to the database in one transaction
+# after this delay (in ms) from the first pending edit, or once there are this many pending edits
+WRITE_BEHIND_FLUSH_DELAY = 2000
+WRITE_BEHIND_MAX_PENDING_EDITS = 50
+
+# Number of table models (one per table and filter) kept by the database session
+MODEL_CACHE_SIZE = 8
+
+# Number of rows written between two progress reports (and cancellation checks) of an export
+EXPORT_CHUNK_SIZE = 5000
+
 # Subclass QMainWindow to customize your application's main window
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -94,6 +219,10 @@ class MainWindow(QMainWindow):
         button_magic.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         button_exit.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 
+        # Database session and viewer, created on first use
+        self.db_manager = None
+        self.database_dialog = None
+
         # Set the main window to show as maximised
         self.showMaximized()
 
@@ -133,60 +262,177 @@ class MainWindow(QMainWindow):
         else:
             logger.debug("MainWindow::on_button_clicked - Alert message terminated")
         
-            # Instantiate the database manager
-            db_manager = DbManager('QSQLITE', 'sportsdatabase.db', app_folder)
-            table_model = QSqlTableModel()
-            db_manager.initialise_model(table_model)
-
-            view_primary = db_manager.create_view("Table Model (View Primary)", table_model)
-            view_primary.clicked.connect(db_manager.find_row)
-            
-            # Create a window to display the database viewer and modifier
-            dlg = QDialog(self)
-            layout_database_window = QVBoxLayout()
-            layout_database_window.addWidget(view_primary)
-            
-            # Add buttons to the window to interact with the database viewer and modifier
-            button_add_row = QPushButton("Add a row")
-            button_add_row.clicked.connect(lambda: db_manager.add_row(table_model))
-            layout_database_window.addWidget(button_add_row)
-
-            button_del_row = QPushButton("Delete a row")
-            button_del_row.clicked.connect(lambda: table_model.removeRow(view_primary.currentIndex().row()))
-            layout_database_window.addWidget(button_del_row)
-
-            button_done = QPushButton("Done")
-            button_done.clicked.connect(dlg.close)
-            layout_database_window.addWidget(button_done)
-            
-            # Set layout and start the window
-            dlg.setLayout(layout_database_window)
-            dlg.setWindowTitle("Database Demo")
+            # The database session and its dialog are created once, and reused until the app exits
+            if self.db_manager is None:
+                self.db_manager = DbManager('QSQLITE', 'sportsdatabase.db', app_folder,
+                        reference_db_path=get_bundled_file_path(REFERENCE_DB_NAME, app_folder))
+                self.db_manager.conflict_handler = self.on_edit_conflicts
+                QApplication.instance().aboutToQuit.connect(self.db_manager.close)
+            if self.database_dialog is None:
+                self.database_dialog = self.create_database_dialog()
+            else:
+                # Reuse the model of the current search (only reloaded if the table changed)
+                self.show_search_results()
+
             logger.debug("MainWindow::on_button_clicked - Database dialog started")
-            dlg.showMaximized()
-            dlg.exec()
+            self.database_dialog.showMaximized()
+            self.database_dialog.exec()
+            # Write the pending edits when the dialog closes
+            self.db_manager.flush_models()
             logger.debug("MainWindow::on_button_clicked - Database dialog terminated")
             logger.debug("MainWindow::on_button_clicked - Exited method")
 
+    def create_database_dialog(self):
+        logger.debug("MainWindow::create_database_dialog - Entered method")
+        self.database_view = self.db_manager.create_view("Table Model (View Primary)", None)
+        self.database_view.clicked.connect(self.db_manager.find_row)
+
+        # Create a window to display the database viewer and modifier
+        dlg = QDialog(self)
+        layout_database_window = QVBoxLayout()
+
+        # Add a search box filtering the rows in the database once the user stops typing
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search (name or ID)")
+        search_timer = QTimer(dlg)
+        search_timer.setSingleShot(True)
+        search_timer.setInterval(SEARCH_DEBOUNCE_DELAY)
+        self.search_box.textChanged.connect(search_timer.start)
+        search_timer.timeout.connect(self.show_search_results)
+        layout_database_window.addWidget(self.search_box)
+        # Add a summary of the table, read from its summary table (instead of counting the rows)
+        self.summary_label = QLabel()
+        layout_database_window.addWidget(self.summary_label)
+        layout_database_window.addWidget(self.database_view)
+        self.show_search_results()
+
+        # Add buttons to the window to interact with the database viewer and modifier
+        button_add_row = QPushButton("Add a row")
+        button_add_row.clicked.connect(lambda: self.db_manager.add_row(self.database_view.model()))
+        layout_database_window.addWidget(button_add_row)
+
+        button_del_row = QPushButton("Delete a row")
+        button_del_row.clicked.connect(lambda: self.database_view.model().removeRow(
+                self.database_view.currentIndex().row()))
+        layout_database_window.addWidget(button_del_row)
+
+        # Export the rows matching the search box to a CSV file in the app folder, in the background
+        self.button_export = QPushButton("Export to CSV")
+        self.button_export.clicked.connect(self.on_export_clicked)
+        self.export_task_id = None
+        query_executor = self.db_manager.get_query_executor()
+        query_executor.signals.progress.connect(self.on_export_progress)
+        query_executor.signals.finished.connect(self.on_export_finished)
+        query_executor.signals.failed.connect(self.on_export_failed)
+        layout_database_window.addWidget(self.button_export)
+
+        button_done = QPushButton("Done")
+        button_done.clicked.connect(dlg.close)
+        layout_database_window.addWidget(button_done)
+
+        # Set layout of the window
+        dlg.setLayout(layout_database_window)
+        dlg.setWindowTitle("Database Demo")
+        logger.debug("MainWindow::create_database_dialog - Exited method")
+        return dlg
+
+    def show_search_results(self):
+        # Display the (cached) model of the rows matching the search box
+        search_filter = self.db_manager.build_search_filter('tennismen', 'id', SEARCH_COLUMNS, self.search_box.text())
+        table_model = self.db_manager.get_model('tennismen', search_filter)
+        if self.database_view.model() is not table_model:
+            self.database_view.setModel(table_model)
+            # Sorting is done by the database (ORDER BY) for the QSqlTableModel
+            self.database_view.setSortingEnabled(isinstance(table_model, QSqlTableModel))
+            if isinstance(table_model, WriteBehindTableModel):
+                table_model.view = self.database_view
+        self.show_summary()
+
+    def show_summary(self):
+        summary = self.db_manager.get_aggregate('tennismen_summary')
+        self.summary_label.setText(str(summary[0]['row_count'] if summary else 0) + " tennismen in the database")
+
+    def on_export_clicked(self):
+        logger.debug("MainWindow::on_export_clicked - Entered method")
+        if self.export_task_id is not None:
+            return
+        self.export_path = os.path.join(app_folder, "tennismen-export.csv")
+        search_filter = self.db_manager.build_search_filter('tennismen', 'id', SEARCH_COLUMNS, self.search_box.text())
+        # Pending edits are written first, so that they are exported
+        self.db_manager.flush_models()
+        self.export_task_id = self.db_manager.export_table('tennismen', self.export_path, filter_clause=search_filter)
+        self.button_export.setText("Exporting...")
+        logger.debug("MainWindow::on_export_clicked - Exited method")
+
+    def on_export_progress(self, task_id, row_count, total_row_count):
+        if task_id == self.export_task_id and total_row_count > 0:
+            self.button_export.setText("Exporting... " + str(100 * row_count // total_row_count) + "%")
+
+    def on_export_finished(self, task_id, row_count):
+        if task_id != self.export_task_id:
+            return
+        self.export_task_id = None
+        self.button_export.setText("Export to CSV")
+        QMessageBox.information(self.database_dialog, "Export",
+                "Exported " + str(row_count) + " rows to " + self.export_path)
+
+    def on_export_failed(self, task_id, error_message):
+        if task_id != self.export_task_id:
+            return
+        self.export_task_id = None
+        self.button_export.setText("Export to CSV")
+        QMessageBox.critical(self.database_dialog, "Export", "Export failed: " + error_message)
+
+    def on_edit_conflicts(self, conflicts):
+        logger.debug("MainWindow::on_edit_conflicts - Entered method")
+        alert = QMessageBox(self.database_dialog or self)
+        alert.setIcon(QMessageBox.Warning)
+        alert.setWindowTitle("Edit conflicts")
+        alert_msg = "The following edits were not saved, as the database changed in the meantime:\n"
+        for conflict in conflicts:
+            alert_msg += ("\n- ID " + str(conflict['key']) + ", " + str(conflict['column']) + ": "
+                    + str(conflict['value']) + " (now " + str(conflict['current']) + ")")
+        alert.setText(alert_msg)
+        alert.exec()
+        logger.debug("MainWindow::on_edit_conflicts - Exited method")
+
 # Database Manager class
 class DbManager():
    
     # Ensure one connection to a database per application
     db_connected = None
     
-    def __init__(self, db_type, db_name, db_folder):
+    def __init__(self, db_type, db_name, db_folder, profile_name=DEFAULT_CONNECTION_PROFILE, reference_db_path=None):
         logger.debug("DbManager::__init__ - Entered method")
 
         self.db_type = db_type
         # Include the extension in the name (e.g. `test.db`)
         self.db_name = db_name 
         self.db_folder = db_folder
+        # Use `:memory:` as name for an in-memory database (e.g. for benchmarks)
+        self.db_path = db_name if db_name == IN_MEMORY_DB_NAME else os.path.join(db_folder, db_name)
+        self.profile_name = profile_name
+        # Read-only database attached to the connection (if any)
+        self.reference_db_path = reference_db_path
+        # Full-text index table of each searchable table
+        self.fts_table_names = {}
+        # Definition of each summary table
+        self.aggregates = {}
+        # Models by (table name, filter), least recently used first, and the data state they were selected at
+        self.models = OrderedDict()
+        self.model_data_states = {}
+        # Function called with the list of conflicts reported by the write-behind models
+        self.conflict_handler = None
+        # Executor of the background queries of the session
+        self.query_executor = None
+        # Timer running the batches of the pending backfills
+        self.backfill_timer = None
         self.delrow = -1
         
         if DbManager.db_connected is None:
             try:
                 DbManager.db_connected = QSqlDatabase.addDatabase(self.db_type)
-                DbManager.db_connected.setDatabaseName(os.path.join(self.db_folder, self.db_name))
+                DbManager.db_connected.setDatabaseName(self.db_path)
             except Exception as error:
                 logger.exception("DbManager::__init__ - Error: Connection not established - " + str(error))
             else:
@@ -195,59 +441,510 @@ class DbManager():
                         + " of type " 
                         + str(self.db_type) 
                         + " at location " 
-                        + str(os.path.join(self.db_folder, self.db_name))
+                        + str(self.db_path)
                         )
 
-        # Initial database creation
-        if not os.path.exists(os.path.join(self.db_folder, self.db_name)):
-            self.create_db()
+        # Open the database (created if needed) and bring its schema up to date
+        if not self.db_connected.isOpen() and not self.open_db():
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Critical)
+            msg.setText("Error in Database Creation")
+            msg.exec_()
+            logger.error("DbManager::__init__ - Error in Database Creation - " + self.db_connected.lastError().text())
+        elif not self.migrate_db():
+            # The search index and the aggregates rely on the latest schema
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Critical)
+            msg.setText("Error in Database Migration")
+            msg.exec_()
+            logger.error("DbManager::__init__ - Error in Database Migration - schema not up to date")
+        else:
+            self.create_search_index('tennismen', 'id', SEARCH_COLUMNS)
+            for aggregate_name, aggregate in AGGREGATES.items():
+                self.create_aggregate(aggregate_name, aggregate['table'], aggregate['group_by'], aggregate['measures'])
 
         logger.info("DbManager::__init__ - Database Manager for " 
-                + str(os.path.join(self.db_folder, self.db_name)) 
+                + str(self.db_path) 
                 + " instantiated"
                 )
 
         logger.debug("DbManager::__init__ - Exited method")
 
-    def __del__(self):
-        logger.debug("DbManager::__del__ - Entered method")
+    def close(self):
+        # Write the pending edits and close the connection (at the end of the app)
+        # Note: the connection is shared by the application, it is not closed when a DbManager is deleted
+        logger.debug("DbManager::close - Entered method")
+        if self.backfill_timer is not None:
+            self.backfill_timer.stop()
+        if self.query_executor is not None:
+            self.query_executor.shutdown()
+            self.query_executor = None
+        self.flush_models()
+        self.models.clear()
+        self.model_data_states.clear()
+        remove_statement_cache(self.db_connected)
         self.db_connected.close()
-        logger.info("DbManager::__del__ - Database Manager for " 
-                + str(os.path.join(self.db_folder, self.db_name)) 
-                + " deleted"
+        logger.info("DbManager::close - Database Manager for " 
+                + str(self.db_path) 
+                + " closed"
                 )
-        logger.debug("DbManager::__del__ - Exited method")
-
-    def create_db(self):
-        logger.debug("DbManager::create_db - Entered method")
-        if not self.db_connected.open():
-          msg = QMessageBox()
-          msg.setIcon(QMessageBox.Critical)
-          msg.setText("Error in Database Creation")
-          retval = msg.exec_()
-          logger.exception("DbManager::create_db - Error in Database Creation")
-          return False
-
-        query = QSqlQuery()
-        query.exec_("create table tennismen(id int primary key, ""firstname varchar(20), lastname varchar(20))")
-
-        query.exec_("insert into tennismen values(101, 'Andre', 'Agassi')")
-        query.exec_("insert into tennismen values(102, 'Novak', 'Djokovic')")
-        query.exec_("insert into tennismen values(103, 'Daniil', 'Medvedev')")
-        query.exec_("insert into tennismen values(104, 'Andy', 'Murray')")
-        query.exec_("insert into tennismen values(105, 'Rafael', 'Nadal')")
-        logger.debug("DbManager::create_db - Created table of tennismen with initial values")
-        logger.debug("DbManager::create_db - Exited method")
+        logger.debug("DbManager::close - Exited method")
+
+    def open_db(self):
+        logger.debug("DbManager::open_db - Entered method")
+        is_open = open_database(self.db_connected, self.profile_name)
+        if is_open and self.reference_db_path is not None:
+            attach_database(self.db_connected, self.reference_db_path, REFERENCE_DB_SCHEMA, REFERENCE_DB_MMAP_SIZE)
+        logger.debug("DbManager::open_db - Exited method")
+        return is_open
+
+    def is_attached(self, schema_name):
+        return any(row[1] == schema_name for row in self.fetch_iter("pragma database_list"))
+
+    def migrate_db(self):
+        # Apply the migrations newer than the schema version of the database (see MIGRATIONS)
+        # and start their backfills. Return whether the schema is up to date.
+        logger.debug("DbManager::migrate_db - Entered method")
+        query = QSqlQuery(self.db_connected)
+        query.exec_("create table if not exists migration_backfills(version integer primary key, last_key)")
+        query.exec_("pragma user_version")
+        schema_version = query.value(0) if query.next() else 0
+        query.finish()
+        is_new_db = False
+        if schema_version == 0:
+            # Databases created before the migrations have the schema of the first version
+            query.exec_("select 1 from sqlite_master where type = 'table' and name = 'tennismen'")
+            is_new_db = not query.next()
+            query.finish()
+            if not is_new_db:
+                schema_version = 1
+
+        pending_migrations = [migration for migration in MIGRATIONS if migration['version'] > schema_version]
+        if pending_migrations:
+            self.db_connected.transaction()
+            for migration in pending_migrations:
+                is_migrated = all(query.exec_(statement) for statement in migration['statements'])
+                # The rows of a new database are created up to date (see seed_db)
+                if is_migrated and 'backfill' in migration and not is_new_db:
+                    is_migrated = query.exec_("insert or replace into migration_backfills (version, last_key) values ("
+                            + str(migration['version']) + ", null)")
+                if not is_migrated:
+                    logger.error("DbManager::migrate_db - Migration to version " + str(migration['version'])
+                            + " failed - " + query.lastError().text())
+                    self.db_connected.rollback()
+                    logger.debug("DbManager::migrate_db - Exited method")
+                    return False
+            if is_new_db and not self.seed_db(query):
+                logger.error("DbManager::migrate_db - Initial values not inserted - " + query.lastError().text())
+                self.db_connected.rollback()
+                logger.debug("DbManager::migrate_db - Exited method")
+                return False
+            # The version is only updated if the whole migration is committed
+            query.exec_("pragma user_version = " + str(pending_migrations[-1]['version']))
+            self.db_connected.commit()
+            logger.info("DbManager::migrate_db - Schema of " + str(self.db_path) + " migrated from version "
+                    + str(schema_version) + " to version " + str(pending_migrations[-1]['version']))
+
+        self.run_backfills()
+        logger.debug("DbManager::migrate_db - Exited method")
         return True
 
-    def initialise_model(self, model):
+    def seed_db(self, query):
+        # Insert the initial values of a new database (in the migration transaction)
+        if self.is_attached(REFERENCE_DB_SCHEMA):
+            return query.exec_("insert into tennismen (id, firstname, lastname, country) "
+                    + "select id, firstname, lastname, country from " + REFERENCE_DB_SCHEMA + ".players")
+        query.prepare("insert into tennismen (id, firstname, lastname) values (?, ?, ?)")
+        return exec_batch(query, [
+                [101, 102, 103, 104, 105],
+                ['Andre', 'Novak', 'Daniil', 'Andy', 'Rafael'],
+                ['Agassi', 'Djokovic', 'Medvedev', 'Murray', 'Nadal'],
+                ])
+
+    def run_backfills(self):
+        # Run the pending backfills one batch (transaction) at a time from the event loop,
+        # so that the app starts without waiting for them
+        if self.backfill_timer is None:
+            self.backfill_timer = QTimer()
+            self.backfill_timer.timeout.connect(self.run_backfill_batch)
+        if self.fetch_one("select 1 from migration_backfills") is not None:
+            self.backfill_timer.start(0)
+
+    def run_backfill_batch(self):
+        # Update the next batch of rows of the oldest pending backfill, and record its progress
+        # in the same transaction, so that an interrupted backfill resumes after its last batch
+        pending_backfill = self.fetch_one("select version, last_key is null, last_key from migration_backfills "
+                + "order by version limit 1")
+        if pending_backfill is None:
+            self.backfill_timer.stop()
+            return
+        version, is_first_batch, last_key = pending_backfill
+        backfill = next(migration['backfill'] for migration in MIGRATIONS if migration['version'] == version)
+        if 'schema' in backfill and not self.is_attached(backfill['schema']):
+            logger.warning("DbManager::run_backfill_batch - Backfill of version " + str(version)
+                    + " postponed until " + backfill['schema'] + " is attached")
+            self.backfill_timer.stop()
+            return
+
+        table_name, key_column = backfill['table'], backfill['key']
+        # The batch follows the last key of the previous batch
+        key_conditions = [] if is_first_batch else [key_column + " > ?"]
+        bind_values = [] if is_first_batch else [last_key]
+        batch = self.fetch_one("select count(*), max(" + key_column + ") from (select " + key_column + " from "
+                + table_name + "".join(" where " + condition for condition in key_conditions)
+                + " order by " + key_column + " limit " + str(BACKFILL_BATCH_SIZE) + ")", bind_values)
+        is_completed = batch is not None and batch[0] == 0
+        self.db_connected.transaction()
+        if batch is None:
+            is_updated = False
+        elif is_completed:
+            is_updated = self.execute("delete from migration_backfills where version = ?", [version]) >= 0
+        else:
+            batch_last_key = batch[1]
+            is_updated = (self.execute("update " + table_name + " set " + backfill['assignments'] + " where "
+                            + " and ".join(key_conditions + [key_column + " <= ?"]), bind_values + [batch_last_key]) >= 0
+                    and self.execute("update migration_backfills set last_key = ? where version = ?",
+                            [batch_last_key, version]) >= 0)
+        if not is_updated:
+            # Retried at the next startup
+            self.db_connected.rollback()
+            self.backfill_timer.stop()
+            logger.error("DbManager::run_backfill_batch - Backfill of version " + str(version) + " failed")
+            return
+        self.db_connected.commit()
+        if is_completed:
+            logger.info("DbManager::run_backfill_batch - Backfill of version " + str(version) + " completed")
+
+    def bulk_insert(self, table_name, column_names, rows, chunk_size=1000):
+        # Insert an iterable of rows (sequences of values ordered as column_names)
+        # in a single transaction (see bulk_insert function).
+        # Return the number of inserted rows, or -1 if the insertion failed (and was rolled back).
+        logger.debug("DbManager::bulk_insert - Entered method")
+        inserted_row_count = bulk_insert(self.db_connected, table_name, column_names, rows, chunk_size)
+        logger.debug("DbManager::bulk_insert - Exited method")
+        return inserted_row_count
+
+    def import_csv(self, table_name, csv_stream, column_names=None, chunk_size=1000, delimiter=","):
+        # Bulk insert the rows of a CSV stream (an open text file or any iterable of lines).
+        # The first line of the stream is the header, unless column_names are given.
+        logger.debug("DbManager::import_csv - Entered method")
+        csv_reader = csv.reader(csv_stream, delimiter=delimiter)
+        if column_names is None:
+            column_names = next(csv_reader, None)
+            if not column_names:
+                logger.error("DbManager::import_csv - Empty CSV stream, no header found")
+                return -1
+        inserted_row_count = self.bulk_insert(table_name, column_names, csv_reader, chunk_size)
+        logger.debug("DbManager::import_csv - Exited method")
+        return inserted_row_count
+
+    def create_query_executor(self, max_thread_count=2):
+        # Return an executor running queries on the database off the GUI thread
+        # Note: the threads of the executor cannot share an in-memory database
+        return QueryExecutor(self.db_type, self.db_path,
+                self.profile_name, max_thread_count)
+
+    def get_query_executor(self):
+        # Return the executor of the session (created on first use)
+        if self.query_executor is None:
+            self.query_executor = self.create_query_executor()
+        return self.query_executor
+
+    def export_table(self, table_name, file_path, export_format=None, filter_clause="", chunk_size=EXPORT_CHUNK_SIZE):
+        # Stream the rows of a table (restricted by a filter) to a CSV or JSON Lines file on a worker thread
+        # The format defaults to the file extension. Return the task ID, whose progress, finished and failed
+        # signals are emitted by the signals of get_query_executor()
+        logger.debug("DbManager::export_table - Entered method")
+        if export_format is None:
+            export_format = os.path.splitext(file_path)[1].lstrip(".").lower()
+        statement = "select * from " + table_name
+        if filter_clause:
+            statement += " where " + filter_clause
+        task_id = self.get_query_executor().export(statement, file_path, export_format, chunk_size=chunk_size)
+        logger.info("DbManager::export_table - Exporting " + table_name + " to " + file_path)
+        logger.debug("DbManager::export_table - Exited method")
+        return task_id
+
+    def execute(self, statement, bind_values=()):
+        # Execute a parameterised statement (prepared once) and return the number of affected rows, or -1
+        return get_statement_cache(self.db_connected).execute(statement, bind_values)
+
+    def fetch_one(self, statement, bind_values=()):
+        # Return the first row of a parameterised select statement (prepared once), or None
+        return get_statement_cache(self.db_connected).fetch_one(statement, bind_values)
+
+    def fetch_iter(self, statement, bind_values=()):
+        # Yield the rows of a parameterised select statement (prepared once) as they are read
+        return get_statement_cache(self.db_connected).fetch_iter(statement, bind_values)
+
+    def count_rows(self, table_name):
+        return get_statement_cache(self.db_connected).fetch_value("select count(*) from " + table_name) or 0
+
+    def create_model(self, table_name, filter_clause=""):
+        # Large tables are loaded page by page, instead of being fully fetched by a QSqlTableModel
+        logger.debug("DbManager::create_model - Entered method")
+        if self.count_rows(table_name) > PAGED_MODEL_ROW_THRESHOLD:
+            # All the columns of the table (including the ones added by migrations)
+            record = self.db_connected.record(table_name)
+            column_names = [record.fieldName(column) for column in range(record.count())]
+            model = PagedTableModel(self.db_connected, table_name, 'id', column_names)
+            set_column_headers(model, column_names)
+            if filter_clause:
+                model.setFilter(filter_clause)
+            logger.info("DbManager::create_model - Paged model created for " + table_name)
+        else:
+            model = WriteBehindTableModel(os.path.join(self.db_folder, self.db_name + "-edits.jsonl"))
+            model.conflicts_detected.connect(self.on_edit_conflicts)
+            self.initialise_model(model, filter_clause)
+            # Write the edits left by a crash, before any new edit
+            model.recover_journal()
+        logger.debug("DbManager::create_model - Exited method")
+        return model
+
+    def on_edit_conflicts(self, conflicts):
+        if self.conflict_handler is not None:
+            self.conflict_handler(conflicts)
+
+    def get_data_state(self):
+        # Return a state which changes whenever the database is modified:
+        # data_version changes with the commits of other connections (e.g. QueryExecutor threads)
+        # and total_changes with the modifications made through this connection
+        statements = get_statement_cache(self.db_connected)
+        return (statements.fetch_value("pragma data_version"), statements.fetch_value("select total_changes()"))
+
+    def get_model(self, table_name, filter_clause=""):
+        # Return the model of a table restricted by a filter, reused from the models of the session
+        # Cached models are only reloaded if the database changed since they were selected
+        logger.debug("DbManager::get_model - Entered method")
+        # Pending edits are written first, as the models share the edit journal
+        self.flush_models()
+        model_key = (table_name, filter_clause)
+        model = self.models.get(model_key)
+        if model is None:
+            model = self.create_model(table_name, filter_clause)
+            self.models[model_key] = model
+            while len(self.models) > MODEL_CACHE_SIZE:
+                evicted_key, _ = self.models.popitem(last=False)
+                del self.model_data_states[evicted_key]
+        else:
+            self.models.move_to_end(model_key)
+            if self.model_data_states[model_key] != self.get_data_state():
+                logger.debug("DbManager::get_model - Reloading model of " + table_name + " as the database changed")
+                if isinstance(model, PagedTableModel):
+                    model.refresh()
+                else:
+                    model.select()
+        self.model_data_states[model_key] = self.get_data_state()
+        logger.debug("DbManager::get_model - Exited method")
+        return model
+
+    def flush_models(self):
+        # Write the pending edits of the models of the session
+        for model in self.models.values():
+            if isinstance(model, WriteBehindTableModel):
+                model.flush()
+
+    def create_search_index(self, table_name, key_column, column_names):
+        # Index the searchable columns (for prefix matches and sorting)
+        # and maintain a full-text index of them through triggers
+        logger.debug("DbManager::create_search_index - Entered method")
+        query = QSqlQuery(self.db_connected)
+        for column_name in column_names:
+            query.exec_("create index if not exists " + table_name + "_" + column_name + "_index on "
+                    + table_name + " (" + column_name + " collate nocase)")
+
+        fts_table_name = table_name + "_fts"
+        query.exec_("select 1 from sqlite_master where name = '" + fts_table_name + "'")
+        if query.next():
+            self.fts_table_names[table_name] = fts_table_name
+            logger.debug("DbManager::create_search_index - Exited method")
+            return True
+
+        columns = ", ".join(column_names)
+        new_values = ", ".join("new." + column_name for column_name in column_names)
+        old_values = ", ".join("old." + column_name for column_name in column_names)
+        statements = [
+            "create virtual table " + fts_table_name + " using fts5(" + columns
+                    + ", content='" + table_name + "', content_rowid='" + key_column + "')",
+            "create trigger " + fts_table_name + "_insert after insert on " + table_name + " begin "
+                    + "insert into " + fts_table_name + " (rowid, " + columns + ") values (new."
+                    + key_column + ", " + new_values + "); end",
+            "create trigger " + fts_table_name + "_delete after delete on " + table_name + " begin "
+                    + "insert into " + fts_table_name + " (" + fts_table_name + ", rowid, " + columns
+                    + ") values ('delete', old." + key_column + ", " + old_values + "); end",
+            "create trigger " + fts_table_name + "_update after update on " + table_name + " begin "
+                    + "insert into " + fts_table_name + " (" + fts_table_name + ", rowid, " + columns
+                    + ") values ('delete', old." + key_column + ", " + old_values + "); "
+                    + "insert into " + fts_table_name + " (rowid, " + columns + ") values (new."
+                    + key_column + ", " + new_values + "); end",
+            # Index the rows which existed before the full-text index
+            "insert into " + fts_table_name + " (" + fts_table_name + ") values ('rebuild')",
+        ]
+        self.db_connected.transaction()
+        for statement in statements:
+            if not query.exec_(statement):
+                # Without full-text search (e.g. SQLite built without FTS5), searches fall back to prefix matches
+                logger.warning("DbManager::create_search_index - Full-text index not created - "
+                        + query.lastError().text())
+                self.db_connected.rollback()
+                logger.debug("DbManager::create_search_index - Exited method")
+                return False
+        self.db_connected.commit()
+        self.fts_table_names[table_name] = fts_table_name
+        logger.info("DbManager::create_search_index - Full-text index created for " + table_name)
+        logger.debug("DbManager::create_search_index - Exited method")
+        return True
+
+    def create_aggregate(self, aggregate_name, table_name, group_by_columns, measures):
+        # Materialise the aggregate of a table in the summary table aggregate_name, with one row per group
+        # of group_by_columns holding its row_count and measures (column: (function, source column)),
+        # and keep it up to date through triggers, so that reading it does not scan the table
+        # Note: a count measure without source column counts the rows, sums of null values are 0
+        logger.debug("DbManager::create_aggregate - Entered method")
+        for function_name, column_name in measures.values():
+            if function_name not in AGGREGATE_FUNCTIONS:
+                logger.error("DbManager::create_aggregate - Unsupported aggregate function " + str(function_name))
+                logger.debug("DbManager::create_aggregate - Exited method")
+                return False
+        aggregate = {'table': table_name, 'group_by': list(group_by_columns),
+                'measures': {column_name: list(measure) for column_name, measure in measures.items()}}
+        definition = json.dumps(aggregate, sort_keys=True)
+
+        # The summary table is only rebuilt (with one scan of the table) when its definition changed
+        query = QSqlQuery(self.db_connected)
+        query.exec_("create table if not exists aggregate_definitions(name varchar(64) primary key, definition text)")
+        query.prepare("select definition from aggregate_definitions where name = ?")
+        query.addBindValue(aggregate_name)
+        if query.exec_() and query.next() and query.value(0) == definition:
+            query.finish()
+            self.aggregates[aggregate_name] = aggregate
+            logger.debug("DbManager::create_aggregate - Exited method")
+            return True
+        query.finish()
+
+        def group_condition(prefix):
+            return " and ".join(column_name + " is " + prefix + column_name for column_name in group_by_columns) or "1"
+
+        def measure_value(prefix, function_name, column_name):
+            if column_name is None:
+                return "1"
+            if function_name == 'count':
+                return "(" + prefix + column_name + " is not null)"
+            return "coalesce(" + prefix + column_name + ", 0)"
+
+        def add_row(prefix):
+            # Create the group of the row if needed, then add the row to it
+            group_values = "".join(prefix + column_name + ", " for column_name in group_by_columns)
+            measure_updates = "".join(", " + measure_column + " = " + measure_column + " + "
+                    + measure_value(prefix, function_name, column_name)
+                    for measure_column, (function_name, column_name) in measures.items())
+            return ("insert into " + aggregate_name + " (" + "".join(column_name + ", " for column_name in group_by_columns)
+                    + "row_count) select " + group_values + "0 where not exists (select 1 from " + aggregate_name
+                    + " where " + group_condition(prefix) + "); "
+                    + "update " + aggregate_name + " set row_count = row_count + 1" + measure_updates
+                    + " where " + group_condition(prefix) + "; ")
+
+        def remove_row(prefix):
+            # Remove the row from its group, then drop the group if it is empty
+            measure_updates = "".join(", " + measure_column + " = " + measure_column + " - "
+                    + measure_value(prefix, function_name, column_name)
+                    for measure_column, (function_name, column_name) in measures.items())
+            return ("update " + aggregate_name + " set row_count = row_count - 1" + measure_updates
+                    + " where " + group_condition(prefix) + "; "
+                    + "delete from " + aggregate_name + " where " + group_condition(prefix) + " and row_count = 0; ")
+
+        def rebuild_value(function_name, column_name):
+            if function_name == 'count':
+                return "count(" + (column_name or "*") + ")"
+            return "coalesce(sum(" + column_name + "), 0)"
+
+        summary_columns = (list(group_by_columns) + ["row_count integer not null default 0"]
+                + [measure_column + " default 0" for measure_column in measures])
+        updated_columns = list(group_by_columns)
+        updated_columns += [column_name for _, column_name in measures.values()
+                if column_name is not None and column_name not in updated_columns]
+        group_by_clause = (" group by " + ", ".join(group_by_columns)) if group_by_columns else ""
+        statements = [
+            "drop trigger if exists " + aggregate_name + "_insert",
+            "drop trigger if exists " + aggregate_name + "_delete",
+            "drop trigger if exists " + aggregate_name + "_update",
+            "drop table if exists " + aggregate_name,
+            "create table " + aggregate_name + "(" + ", ".join(summary_columns) + ")",
+            "create trigger " + aggregate_name + "_insert after insert on " + table_name + " begin "
+                    + add_row("new.") + "end",
+            "create trigger " + aggregate_name + "_delete after delete on " + table_name + " begin "
+                    + remove_row("old.") + "end",
+            # Aggregate the rows which existed before the summary table
+            "insert into " + aggregate_name + " (" + "".join(column_name + ", " for column_name in group_by_columns)
+                    + "row_count" + "".join(", " + measure_column for measure_column in measures) + ") select "
+                    + "".join(column_name + ", " for column_name in group_by_columns) + "count(*)"
+                    + "".join(", " + rebuild_value(function_name, column_name)
+                            for function_name, column_name in measures.values())
+                    + " from " + table_name + group_by_clause + " having count(*) > 0",
+            "insert or replace into aggregate_definitions (name, definition) values ('" + aggregate_name + "', '"
+                    + definition.replace("'", "''") + "')",
+        ]
+        if group_by_columns:
+            # Groups are looked up by the triggers on every change
+            statements.insert(5, "create unique index " + aggregate_name + "_group_index on " + aggregate_name
+                    + " (" + ", ".join(group_by_columns) + ")")
+        if updated_columns:
+            statements.insert(-2, "create trigger " + aggregate_name + "_update after update of "
+                    + ", ".join(updated_columns) + " on " + table_name + " begin "
+                    + remove_row("old.") + add_row("new.") + "end")
+
+        self.db_connected.transaction()
+        for statement in statements:
+            if not query.exec_(statement):
+                logger.error("DbManager::create_aggregate - Summary table " + aggregate_name + " not created - "
+                        + query.lastError().text())
+                self.db_connected.rollback()
+                logger.debug("DbManager::create_aggregate - Exited method")
+                return False
+        self.db_connected.commit()
+        self.aggregates[aggregate_name] = aggregate
+        logger.info("DbManager::create_aggregate - Summary table " + aggregate_name + " created for " + table_name)
+        logger.debug("DbManager::create_aggregate - Exited method")
+        return True
+
+    def get_aggregate(self, aggregate_name):
+        # Return the groups of a summary table as dicts (grouping columns, row_count and measures)
+        aggregate = self.aggregates[aggregate_name]
+        column_names = aggregate['group_by'] + ['row_count'] + list(aggregate['measures'])
+        return [dict(zip(column_names, row))
+                for row in self.fetch_iter("select " + ", ".join(column_names) + " from " + aggregate_name)]
+
+    def build_search_filter(self, table_name, key_column, column_names, search_text):
+        # Return the SQL filter (for setFilter) of the rows matching every word of search_text
+        # A number matches the key, other words match the beginning of any word of the searched columns
+        words = search_text.split()
+        if not words:
+            return ""
+        if len(words) == 1 and words[0].isdigit():
+            return key_column + " = " + words[0]
+
+        fts_table_name = self.fts_table_names.get(table_name)
+        if fts_table_name:
+            # Quote each word (double quotes for FTS5, single quotes for SQL) and match it as a prefix
+            match_expression = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+            return (key_column + " in (select rowid from " + fts_table_name + " where " + fts_table_name
+                    + " match '" + match_expression.replace("'", "''") + "')")
+
+        word_conditions = []
+        for word in words:
+            pattern = word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("'", "''")
+            word_conditions.append("(" + " or ".join(column_name + " like '" + pattern + "%' escape '\\'"
+                    for column_name in column_names) + ")")
+        return " and ".join(word_conditions)
+
+    def initialise_model(self, model, filter_clause=""):
         logger.debug("DbManager::initialise_model - Entered method")
         model.setTable('tennismen')
-        model.setEditStrategy(QSqlTableModel.OnFieldChange)
+        if not isinstance(model, WriteBehindTableModel):
+            model.setEditStrategy(QSqlTableModel.OnFieldChange)
+        model.setFilter(filter_clause)
         model.select()
-        model.setHeaderData(0, Qt.Horizontal, "ID")
-        model.setHeaderData(1, Qt.Horizontal, "First name")
-        model.setHeaderData(2, Qt.Horizontal, "Last name")
+        set_column_headers(model, [model.record().fieldName(column) for column in range(model.record().count())])
         logger.debug("DbManager::initialise_model - Exited method")
 
     def create_view(self, title, model):
@@ -270,8 +967,912 @@ class DbManager():
         self.delrow = i.row()
         logger.debug("DbManager::add_row - Exited method")
 
+# Prepared statements of a connection, kept in a bounded LRU keyed by SQL text
+# so that repeated statements are parsed once (use get_statement_cache to share it)
+class StatementCache():
+
+    def __init__(self, db, max_size=STATEMENT_CACHE_SIZE):
+        self.db = db
+        self.max_size = max_size
+        self.queries = OrderedDict()
+        # Statements whose rows are being iterated (a nested use gets a new query)
+        self.busy_statements = set()
+
+    def prepare(self, statement, bind_values=()):
+        # Return a query prepared for statement with bind_values bound, or None on error
+        query = self.queries.get(statement) if statement not in self.busy_statements else None
+        if query is not None:
+            self.queries.move_to_end(statement)
+        else:
+            query = QSqlQuery(self.db)
+            query.setForwardOnly(True)
+            if not query.prepare(statement):
+                logger.error("StatementCache::prepare - " + query.lastError().text() + " - " + statement)
+                return None
+            if statement not in self.busy_statements:
+                self.queries[statement] = query
+                while len(self.queries) > self.max_size:
+                    self.queries.popitem(last=False)
+        for value in bind_values:
+            query.addBindValue(value)
+        return query
+
+    def run(self, statement, bind_values=()):
+        query = self.prepare(statement, bind_values)
+        if query is None:
+            return None
+        if not query.exec_():
+            logger.error("StatementCache::run - " + query.lastError().text() + " - " + statement)
+            query.finish()
+            return None
+        return query
+
+    def execute(self, statement, bind_values=()):
+        # Execute a statement and return the number of affected rows, or -1 on error
+        query = self.run(statement, bind_values)
+        if query is None:
+            return -1
+        row_count = query.numRowsAffected()
+        query.finish()
+        return row_count
+
+    def fetch_one(self, statement, bind_values=()):
+        # Return the first row (tuple) of a select statement, or None if there is none (or on error)
+        query = self.run(statement, bind_values)
+        if query is None or not query.next():
+            return None
+        row = tuple(query.value(column) for column in range(query.record().count()))
+        # Release the statement (and its read lock) without fetching the other rows
+        query.finish()
+        return row
+
+    def fetch_value(self, statement, bind_values=()):
+        # Return the first value of the first row of a select statement, or None
+        row = self.fetch_one(statement, bind_values)
+        return row[0] if row else None
+
+    def fetch_iter(self, statement, bind_values=()):
+        # Yield the rows (tuples) of a select statement as they are read, without loading them all
+        query = self.run(statement, bind_values)
+        if query is None:
+            return
+        # Only the iteration using the cached query marks it busy
+        is_cached_query = (self.queries.get(statement) is query)
+        if is_cached_query:
+            self.busy_statements.add(statement)
+        try:
+            column_count = query.record().count()
+            while query.next():
+                yield tuple(query.value(column) for column in range(column_count))
+        finally:
+            if is_cached_query:
+                self.busy_statements.discard(statement)
+            query.finish()
+
+    def clear(self):
+        self.queries.clear()
+
+# Statement caches by connection name
+statement_caches = {}
+
+def get_statement_cache(db):
+    # Return the statement cache of a connection (created on first use)
+    connection_name = db.connectionName()
+    if connection_name not in statement_caches:
+        statement_caches[connection_name] = StatementCache(db)
+    return statement_caches[connection_name]
+
+def remove_statement_cache(db):
+    # Drop the prepared statements of a connection (needed before closing or removing it)
+    statement_cache = statement_caches.pop(db.connectionName(), None)
+    if statement_cache is not None:
+        statement_cache.clear()
+
+# Table model loading pages of rows on demand, for tables too large to be fully loaded
+class PagedTableModel(QAbstractTableModel):
+
+    def __init__(self, db, table_name, key_column, column_names, page_size=200, max_cached_pages=20, parent=None):
+        super().__init__(parent)
+        logger.debug("PagedTableModel::__init__ - Entered method")
+
+        self.db = db
+        self.table_name = table_name
+        # The key column must be unique and indexed (e.g. the primary key) for keyset pagination
+        self.key_column = key_column
+        self.column_names = list(column_names)
+        self.page_size = page_size
+        self.max_cached_pages = max_cached_pages
+        self.statements = get_statement_cache(db)
+        self.header_data = {}
+        # Pages of rows, ordered from least to most recently used
+        self.pages = OrderedDict()
+        # First key of the pages whose boundaries are known (for keyset pagination)
+        self.page_first_keys = {}
+        self.last_page_index = 0
+        # Page loaded once the event loop is idle (only the latest requested page is prefetched)
+        self.prefetch_page_index = None
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(0)
+        self.prefetch_timer.timeout.connect(self.prefetch_page)
+        # SQL condition restricting the rows (same format as QSqlTableModel filters)
+        self.filter_clause = ""
+        self.row_count = self.count_rows()
+
+        logger.debug("PagedTableModel::__init__ - Exited method")
+
+    def count_rows(self):
+        return self.statements.fetch_value("select count(*) from " + self.table_name + self.get_where_clause()) or 0
+
+    def refresh(self):
+        # Drop the cached pages and reload the row count (e.g. after external changes)
+        self.beginResetModel()
+        self.pages.clear()
+        self.page_first_keys.clear()
+        self.row_count = self.count_rows()
+        self.endResetModel()
+
+    def filter(self):
+        return self.filter_clause
+
+    def setFilter(self, filter_clause):
+        self.filter_clause = filter_clause
+        self.refresh()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.column_names)
+
+    def setHeaderData(self, section, orientation, value, role=Qt.EditRole):
+        self.header_data[(section, orientation)] = value
+        self.headerDataChanged.emit(orientation, section, section)
+        return True
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if (section, orientation) in self.header_data:
+            return self.header_data[(section, orientation)]
+        if orientation == Qt.Horizontal and section < len(self.column_names):
+            return self.column_names[section]
+        return section + 1
+
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemIsEditable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        row = self.get_row(index.row())
+        return row[index.column()] if row is not None else None
+
+    def get_row(self, row_index):
+        page_index, row_in_page = divmod(row_index, self.page_size)
+        page = self.get_page(page_index)
+        if row_in_page >= len(page):
+            return None
+
+        # Prefetch the next page in the scroll direction once the current page is displayed
+        if page_index != self.last_page_index:
+            next_page_index = page_index + (1 if page_index > self.last_page_index else -1)
+            self.last_page_index = page_index
+            if next_page_index >= 0 and next_page_index not in self.pages:
+                self.prefetch_page_index = next_page_index
+                self.prefetch_timer.start()
+        return page[row_in_page]
+
+    def prefetch_page(self):
+        if self.prefetch_page_index is not None:
+            self.get_page(self.prefetch_page_index)
+            self.prefetch_page_index = None
+
+    def get_page(self, page_index):
+        if page_index in self.pages:
+            self.pages.move_to_end(page_index)
+            return self.pages[page_index]
+
+        page = self.fetch_page(page_index)
+        self.pages[page_index] = page
+        while len(self.pages) > self.max_cached_pages:
+            self.pages.popitem(last=False)
+        return page
+
+    def get_where_clause(self, key_condition=None):
+        conditions = [condition for condition in ("(" + self.filter_clause + ")" if self.filter_clause else None,
+                key_condition) if condition]
+        return " where " + " and ".join(conditions) if conditions else ""
+
+    def fetch_page(self, page_index):
+        # Keyset pagination: seek the key index to the first key of the page
+        # (or to the closest known page before it and skip the rows in between)
+        known_page_index = max((index for index in self.page_first_keys if index <= page_index), default=None)
+        key_condition = None if known_page_index is None else self.key_column + " >= ?"
+        bind_values = [] if known_page_index is None else [self.page_first_keys[known_page_index]]
+        if known_page_index is None:
+            known_page_index = 0
+        bind_values += [self.page_size, (page_index - known_page_index) * self.page_size]
+
+        # Each cached row ends with its key
+        page = list(self.statements.fetch_iter("select " + ", ".join(self.column_names) + ", " + self.key_column
+                + " from " + self.table_name + self.get_where_clause(key_condition)
+                + " order by " + self.key_column + " limit ? offset ?", bind_values))
+        if page:
+            self.page_first_keys[page_index] = page[0][-1]
+            # The next page starts right after the last key of this page
+            if len(page) == self.page_size and page_index + 1 not in self.page_first_keys:
+                next_key = self.get_key_after(page[-1][-1])
+                if next_key is not None:
+                    self.page_first_keys[page_index + 1] = next_key
+        return page
+
+    def get_key_after(self, key):
+        return self.statements.fetch_value("select min(" + self.key_column + ") from " + self.table_name
+                + self.get_where_clause(self.key_column + " > ?"), [key])
+
+    def get_key(self, row_index):
+        page_index, row_in_page = divmod(row_index, self.page_size)
+        page = self.get_page(page_index)
+        if row_in_page >= len(page):
+            return None
+        return page[row_in_page][-1]
+
+    def invalidate_pages_from(self, row_index):
+        # Rows after a change may move to another page: forget those pages
+        first_page_index = row_index // self.page_size
+        for page_index in [index for index in self.pages if index >= first_page_index]:
+            del self.pages[page_index]
+        for page_index in [index for index in self.page_first_keys if index > first_page_index]:
+            del self.page_first_keys[page_index]
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        key = self.get_key(index.row())
+        if self.statements.execute("update " + self.table_name + " set " + self.column_names[index.column()]
+                + " = ? where " + self.key_column + " = ?", [value, key]) < 0:
+            return False
+        self.invalidate_pages_from(index.row() if self.column_names[index.column()] != self.key_column else 0)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def insertRows(self, row, count, parent=QModelIndex()):
+        # New rows are appended with the next keys, whatever the requested position
+        query = QSqlQuery(self.db)
+        if not query.exec_("select coalesce(max(" + self.key_column + "), 0) from " + self.table_name) \
+                or not query.next():
+            logger.error("PagedTableModel::insertRows - " + query.lastError().text())
+            return False
+        next_key = query.value(0) + 1
+        # The statement runs first, so that a failure leaves the model untouched
+        query.prepare("insert into " + self.table_name + " (" + self.key_column + ") values (?)")
+        query.addBindValue(list(range(next_key, next_key + count)))
+        if not query.execBatch():
+            logger.error("PagedTableModel::insertRows - " + query.lastError().text())
+            return False
+        self.beginInsertRows(QModelIndex(), self.row_count, self.row_count + count - 1)
+        self.row_count += count
+        self.invalidate_pages_from(self.row_count - count)
+        self.endInsertRows()
+        return True
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        if row < 0 or row + count > self.row_count:
+            return False
+        keys = [self.get_key(row_index) for row_index in range(row, row + count)]
+        query = QSqlQuery(self.db)
+        query.prepare("delete from " + self.table_name + " where " + self.key_column + " = ?")
+        query.addBindValue(keys)
+        if not query.execBatch():
+            logger.error("PagedTableModel::removeRows - " + query.lastError().text())
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        self.row_count -= count
+        self.invalidate_pages_from(row)
+        self.endRemoveRows()
+        return True
+
+# Table model buffering the edits and writing them behind, in one transaction
+# Edits of the same field are merged, and every edit is first appended to a journal
+# file so that pending edits survive a crash of the app (see recover_journal)
+class WriteBehindTableModel(QSqlTableModel):
+
+    # List of dicts describing the edits which were not written because the
+    # database value changed since it was displayed (key, column, original, current, value)
+    conflicts_detected = pyqtSignal(list)
+
+    def __init__(self, journal_path, flush_delay=WRITE_BEHIND_FLUSH_DELAY,
+            max_pending_edits=WRITE_BEHIND_MAX_PENDING_EDITS, parent=None, db=QSqlDatabase()):
+        super().__init__(parent, db)
+        logger.debug("WriteBehindTableModel::__init__ - Entered method")
+        self.setEditStrategy(QSqlTableModel.OnManualSubmit)
+        self.journal_path = journal_path
+        self.max_pending_edits = max_pending_edits
+        # Pending edits by (key, insert ID, column name), with the original and latest values
+        # Note: rows inserted since the last flush have no key yet, they are identified by an insert ID
+        self.pending_edits = OrderedDict()
+        self.inserted_rows = {}
+        self.next_insert_id = 0
+        self.is_flushing = False
+        # View displaying the model: writing resets the model, so it waits while an editor is open in the view
+        self.view = None
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(flush_delay)
+        self.flush_timer.timeout.connect(self.request_flush)
+        logger.debug("WriteBehindTableModel::__init__ - Exited method")
+
+    def get_row_identity(self, row):
+        # Return the (key, insert ID) of a row
+        if row in self.inserted_rows:
+            return None, self.inserted_rows[row]
+        return self.primaryValues(row).value(0), None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return super().setData(index, value, role)
+        key, insert_id = self.get_row_identity(index.row())
+        column_name = self.record().fieldName(index.column())
+        original_value = self.data(index)
+        if not super().setData(index, value, role):
+            return False
+
+        # Merge the edits of the same field: keep the value displayed before the first edit
+        edit_id = (key, insert_id, column_name)
+        pending_edit = self.pending_edits.setdefault(edit_id, {'original': original_value})
+        pending_edit['value'] = value
+        self.append_journal_entry({'key': key, 'insert_id': insert_id, 'column': column_name,
+                'original': pending_edit['original'], 'value': value})
+
+        if len(self.pending_edits) >= self.max_pending_edits:
+            self.request_flush()
+        elif not self.flush_timer.isActive():
+            self.flush_timer.start()
+        return True
+
+    def insertRows(self, row, count, parent=QModelIndex()):
+        if not super().insertRows(row, count, parent):
+            return False
+        self.inserted_rows = {(inserted_row + count if inserted_row >= row else inserted_row): insert_id
+                for inserted_row, insert_id in self.inserted_rows.items()}
+        for inserted_row in range(row, row + count):
+            self.inserted_rows[inserted_row] = self.next_insert_id
+            self.next_insert_id += 1
+        return True
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        # Removals are written immediately, after the pending edits
+        if not self.flush():
+            return False
+        if not super().removeRows(row, count, parent):
+            return False
+        return self.flush()
+
+    def select(self):
+        # Selecting again (e.g. new filter or sort order) drops the edits of the model cache
+        if not self.is_flushing:
+            self.flush()
+        return super().select()
+
+    def append_journal_entry(self, entry):
+        try:
+            with open(self.journal_path, "a") as journal_file:
+                journal_file.write(json.dumps(entry) + "\n")
+        except (OSError, TypeError) as error:
+            logger.error("WriteBehindTableModel::append_journal_entry - " + str(error))
+
+    def clear_journal(self):
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def read_current_value(self, key, column_name):
+        return get_statement_cache(self.database()).fetch_value("select " + column_name + " from "
+                + self.tableName() + " where " + self.primaryKey().fieldName(0) + " = ?", [key])
+
+    def find_conflicts(self, edits):
+        # Return the edits whose original value is no longer the value in the database
+        conflicts = []
+        for (key, insert_id, column_name), edit in edits.items():
+            if key is None:
+                continue
+            current_value = self.read_current_value(key, column_name)
+            if current_value != edit['original']:
+                conflicts.append({'key': key, 'column': column_name, 'original': edit['original'],
+                        'current': current_value, 'value': edit['value']})
+        return conflicts
+
+    def is_editor_open(self):
+        return self.view is not None and self.view.state() == QAbstractItemView.EditingState
+
+    def request_flush(self):
+        # Flush, unless an editor is open (its text would be discarded by the reset of the model):
+        # the flush is then postponed by the flush delay
+        if self.is_editor_open():
+            self.flush_timer.start()
+            return False
+        return self.flush()
+
+    def flush(self):
+        # Write the pending edits, insertions and removals in one transaction
+        # Return False if they could not be written (they are kept pending)
+        self.flush_timer.stop()
+        if not self.isDirty():
+            # Edits may have been reverted (but a journal left by a crash is kept until recovered)
+            if self.pending_edits:
+                self.pending_edits.clear()
+                self.clear_journal()
+            self.inserted_rows.clear()
+            return True
+        logger.debug("WriteBehindTableModel::flush - Entered method")
+
+        db = self.database()
+        db.transaction()
+        conflicts = self.find_conflicts(self.pending_edits)
+        conflicting_edits = set((conflict['key'], conflict['column']) for conflict in conflicts)
+        conflicting_keys = set(key for key, column_name in conflicting_edits)
+        for row in range(self.rowCount()):
+            key = self.primaryValues(row).value(0)
+            if row in self.inserted_rows or key not in conflicting_keys:
+                continue
+            # Setting the original value back would still overwrite the concurrent write:
+            # the whole row is reverted and its non-conflicting edits are set again
+            self.revertRow(row)
+            for (edit_key, insert_id, column_name), edit in self.pending_edits.items():
+                if edit_key == key and (key, column_name) not in conflicting_edits:
+                    super().setData(self.index(row, self.fieldIndex(column_name)), edit['value'])
+
+        # submitAll selects the rows again, which resets the current cell of the view
+        current_index = self.view.currentIndex() if self.view is not None else QModelIndex()
+        self.is_flushing = True
+        submitted = self.submitAll()
+        self.is_flushing = False
+        if current_index.isValid() and self.view.model() is self:
+            self.view.setCurrentIndex(self.index(min(current_index.row(), self.rowCount() - 1), current_index.column()))
+        if not submitted or not db.commit():
+            logger.error("WriteBehindTableModel::flush - Cannot write the pending edits - "
+                    + self.lastError().text())
+            db.rollback()
+            logger.debug("WriteBehindTableModel::flush - Exited method")
+            return False
+
+        logger.info("WriteBehindTableModel::flush - Wrote " + str(len(self.pending_edits))
+                + " merged edits to " + self.tableName())
+        self.pending_edits.clear()
+        self.inserted_rows.clear()
+        self.clear_journal()
+        if conflicts:
+            self.conflicts_detected.emit(conflicts)
+        logger.debug("WriteBehindTableModel::flush - Exited method")
+        return True
+
+    def recover_journal(self):
+        # Write the edits journaled before a crash of the app
+        # Note: call it once the table is set and before any edit, as flushing clears the journal
+        # Return the conflicts, which are also reported through conflicts_detected
+        if not os.path.exists(self.journal_path):
+            return []
+        logger.debug("WriteBehindTableModel::recover_journal - Entered method")
+        edits = OrderedDict()
+        with open(self.journal_path) as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last entry may be partially written
+                    continue
+                edit = edits.setdefault((entry['key'], entry['insert_id'], entry['column']),
+                        {'original': entry['original']})
+                edit['value'] = entry['value']
+
+        db = self.database()
+        db.transaction()
+        conflicts = self.find_conflicts(edits)
+        conflicting_edits = set((conflict['key'], conflict['column']) for conflict in conflicts)
+        key_column = self.primaryKey().fieldName(0)
+        query = QSqlQuery(db)
+        inserted_rows = OrderedDict()
+        for (key, insert_id, column_name), edit in edits.items():
+            if key is None:
+                inserted_rows.setdefault(insert_id, OrderedDict())[column_name] = edit['value']
+            elif (key, column_name) not in conflicting_edits:
+                query.prepare("update " + self.tableName() + " set " + column_name + " = ? where "
+                        + key_column + " = ?")
+                query.addBindValue(edit['value'])
+                query.addBindValue(key)
+                is_written = query.exec_()
+                if not is_written:
+                    break
+        else:
+            for values in inserted_rows.values():
+                query.prepare("insert into " + self.tableName() + " (" + ", ".join(values) + ") values ("
+                        + ", ".join("?" for _ in values) + ")")
+                for value in values.values():
+                    query.addBindValue(value)
+                is_written = query.exec_()
+                if not is_written:
+                    break
+            else:
+                is_written = db.commit()
+        if not is_written:
+            # The journal is kept for a later attempt
+            logger.error("WriteBehindTableModel::recover_journal - Cannot write the journaled edits - "
+                    + query.lastError().text() + db.lastError().text())
+            db.rollback()
+            logger.debug("WriteBehindTableModel::recover_journal - Exited method")
+            return []
+
+        logger.info("WriteBehindTableModel::recover_journal - Recovered " + str(len(edits)) + " journaled edits")
+        self.clear_journal()
+        self.select()
+        if conflicts:
+            self.conflicts_detected.emit(conflicts)
+        logger.debug("WriteBehindTableModel::recover_journal - Exited method")
+        return conflicts
+
+# Signals of the query tasks (a QRunnable cannot emit signals itself)
+class QueryTaskSignals(QObject):
+    # Task ID and batch of rows (list of tuples)
+    rows_ready = pyqtSignal(int, list)
+    # Task ID and result (number of rows fetched, inserted or affected)
+    finished = pyqtSignal(int, int)
+    # Task ID and error message
+    failed = pyqtSignal(int, str)
+    # Task ID, number of rows processed and total number of rows (-1 if unknown)
+    progress = pyqtSignal(int, int, int)
+
+# Query run on a thread of the QueryExecutor pool, with the connection of that thread
+class QueryTask(QRunnable):
+
+    def __init__(self, executor, task_id, work):
+        super().__init__()
+        self.executor = executor
+        self.task_id = task_id
+        # Function called with the connection, the task and returning the result
+        self.work = work
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            self.executor.forget_task(self.task_id)
+            return
+        try:
+            db = self.executor.get_thread_connection()
+            result = self.work(db, self)
+        except Exception as error:
+            logger.exception("QueryTask::run - Task " + str(self.task_id) + " failed")
+            self.executor.signals.failed.emit(self.task_id, str(error))
+        else:
+            if not self.cancelled:
+                self.executor.signals.finished.emit(self.task_id, result)
+        finally:
+            self.executor.forget_task(self.task_id)
+
+# Executor running queries on a pool of worker threads, each with its own named connection
+# Results are sent back to the GUI thread through the signals of the executor, in batches
+class QueryExecutor():
+
+    def __init__(self, db_type, db_path, profile_name=DEFAULT_CONNECTION_PROFILE, max_thread_count=2):
+        logger.debug("QueryExecutor::__init__ - Entered method")
+        self.db_type = db_type
+        self.db_path = db_path
+        self.profile_name = profile_name
+        # Created in the GUI thread, so that the signals are queued to the GUI thread
+        self.signals = QueryTaskSignals()
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(max_thread_count)
+        # Keep the threads (and their connections) alive while the executor exists
+        self.thread_pool.setExpiryTimeout(-1)
+        self.connection_names = set()
+        self.tasks = {}
+        self.next_task_id = 0
+        logger.debug("QueryExecutor::__init__ - Exited method")
+
+    def get_thread_connection(self):
+        # Return the connection of the current thread, opening it on first use
+        # Note: a connection can only be used by the thread which created it
+        connection_name = "query_executor_" + str(id(self)) + "_" + str(int(QThread.currentThreadId()))
+        if QSqlDatabase.contains(connection_name):
+            return QSqlDatabase.database(connection_name, False)
+        db = QSqlDatabase.addDatabase(self.db_type, connection_name)
+        db.setDatabaseName(self.db_path)
+        if not open_database(db, self.profile_name):
+            raise Exception("Cannot open database " + self.db_path + " - " + db.lastError().text())
+        self.connection_names.add(connection_name)
+        return db
+
+    def submit(self, work):
+        # Run work(db, task) on a worker thread and return the task ID
+        task_id = self.next_task_id
+        self.next_task_id += 1
+        task = QueryTask(self, task_id, work)
+        self.tasks[task_id] = task
+        self.thread_pool.start(task)
+        return task_id
+
+    def forget_task(self, task_id):
+        self.tasks.pop(task_id, None)
+
+    def cancel(self, task_id):
+        # Stop a task before it starts or between two batches of rows
+        task = self.tasks.get(task_id)
+        if task is not None:
+            task.cancelled = True
+
+    def execute(self, statement, bind_values=(), batch_size=500):
+        # Execute a statement and stream its rows (if any) through rows_ready in batches of batch_size rows
+        def work(db, task):
+            query = QSqlQuery(db)
+            query.setForwardOnly(True)
+            query.prepare(statement)
+            for value in bind_values:
+                query.addBindValue(value)
+            if not query.exec_():
+                raise Exception(query.lastError().text())
+            if not query.isSelect():
+                return query.numRowsAffected()
+
+            column_count = query.record().count()
+            row_count = 0
+            rows = []
+            while query.next():
+                rows.append(tuple(query.value(column) for column in range(column_count)))
+                if len(rows) >= batch_size:
+                    if task.cancelled:
+                        return row_count
+                    self.signals.rows_ready.emit(task.task_id, rows)
+                    row_count += len(rows)
+                    rows = []
+            if rows:
+                self.signals.rows_ready.emit(task.task_id, rows)
+                row_count += len(rows)
+            return row_count
+
+        return self.submit(work)
+
+    def import_csv(self, table_name, csv_path, column_names=None, chunk_size=1000, delimiter=","):
+        # Bulk insert the rows of a CSV file (the first line is the header, unless column_names are given)
+        def work(db, task):
+            with open(csv_path, newline="") as csv_file:
+                csv_reader = csv.reader(csv_file, delimiter=delimiter)
+                names = column_names if column_names is not None else next(csv_reader, None)
+                if not names:
+                    raise Exception("Empty CSV file " + csv_path + ", no header found")
+                inserted_row_count = bulk_insert(db, table_name, names, csv_reader, chunk_size)
+            if inserted_row_count < 0:
+                raise Exception("Import of " + csv_path + " into " + table_name + " failed")
+            return inserted_row_count
+
+        return self.submit(work)
+
+    def export(self, statement, file_path, export_format, bind_values=(), chunk_size=EXPORT_CHUNK_SIZE):
+        # Stream the rows of a select statement to a file (see EXPORT_FORMATS), chunk_size rows at a time
+        # The file is written under a temporary name and only renamed once complete
+        def work(db, task):
+            query = QSqlQuery(db)
+            query.setForwardOnly(True)
+            query.prepare("select count(*) from (" + statement + ")")
+            for value in bind_values:
+                query.addBindValue(value)
+            total_row_count = query.value(0) if query.exec_() and query.next() else -1
+            query.prepare(statement)
+            for value in bind_values:
+                query.addBindValue(value)
+            if not query.exec_():
+                raise Exception(query.lastError().text())
+
+            record = query.record()
+            column_names = [record.fieldName(column) for column in range(record.count())]
+            temporary_path = file_path + ".part"
+            row_count = 0
+            try:
+                with open(temporary_path, "w", newline="", encoding="utf-8") as export_file:
+                    write_row = EXPORT_FORMATS[export_format](export_file, column_names)
+                    while query.next():
+                        # PyQt returns an empty string for the NULL values of text columns
+                        write_row([None if query.isNull(column) else query.value(column)
+                                for column in range(len(column_names))])
+                        row_count += 1
+                        if row_count % chunk_size == 0:
+                            if task.cancelled:
+                                break
+                            self.signals.progress.emit(task.task_id, row_count, total_row_count)
+                query.finish()
+                if task.cancelled:
+                    os.remove(temporary_path)
+                    return row_count
+                os.replace(temporary_path, file_path)
+            except Exception:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+                raise
+            self.signals.progress.emit(task.task_id, row_count, row_count)
+            return row_count
+
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError("Unknown export format " + str(export_format))
+        return self.submit(work)
+
+    def shutdown(self):
+        # Cancel the pending tasks, wait for the running ones and close the connections of the threads
+        logger.debug("QueryExecutor::shutdown - Entered method")
+        for task in list(self.tasks.values()):
+            task.cancelled = True
+        self.thread_pool.clear()
+        self.thread_pool.waitForDone()
+        # Note: the connections belong to the (now idle) threads of the pool, they are
+        # removed without being requested from this thread
+        for connection_name in self.connection_names:
+            QSqlDatabase.removeDatabase(connection_name)
+        self.connection_names.clear()
+        logger.debug("QueryExecutor::shutdown - Exited method")
+
 ## Application definition
 
+def create_csv_writer(export_file, column_names):
+    csv_writer = csv.writer(export_file)
+    csv_writer.writerow(column_names)
+    return csv_writer.writerow
+
+def create_jsonl_writer(export_file, column_names):
+    def write_row(row):
+        export_file.write(json.dumps(dict(zip(column_names, row)), ensure_ascii=False) + "\n")
+    return write_row
+
+# Export formats: function taking the open file and the column names and returning a function writing a row
+EXPORT_FORMATS = {
+    'csv': create_csv_writer,
+    'jsonl': create_jsonl_writer,
+}
+
+
+def open_database(db, profile_name=DEFAULT_CONNECTION_PROFILE):
+    # Open a database connection and apply the pragmas of a connection profile (SQLite only)
+    profile = CONNECTION_PROFILES[profile_name]
+    is_sqlite = (db.driverName() == 'QSQLITE')
+    if is_sqlite:
+        # URI file names allow attaching databases with parameters (see attach_database)
+        db.setConnectOptions("QSQLITE_BUSY_TIMEOUT=" + str(profile['busy_timeout']) + ";QSQLITE_OPEN_URI")
+    if not db.open():
+        logger.error("open_database - Cannot open database - " + db.lastError().text())
+        return False
+
+    if is_sqlite:
+        query = QSqlQuery(db)
+        for pragma_name, pragma_value in profile['pragmas'].items():
+            if not query.exec_("pragma " + pragma_name + " = " + str(pragma_value)):
+                logger.warning("open_database - Cannot apply pragma " + pragma_name
+                        + " - " + query.lastError().text())
+    logger.info("open_database - Database " + db.databaseName() + " opened with connection profile " + profile_name)
+    return True
+
+
+def set_column_headers(model, column_names):
+    # Set the headers of the columns (see COLUMN_HEADERS) of a model
+    for column, column_name in enumerate(column_names):
+        if column_name in COLUMN_HEADERS:
+            model.setHeaderData(column, Qt.Horizontal, COLUMN_HEADERS[column_name])
+
+def attach_database(db, db_path, schema_name, mmap_size=0):
+    # Attach a read-only SQLite database to an open connection, opened as immutable:
+    # SQLite then neither locks the file nor checks it for changes
+    # Note: the connection must be opened with QSQLITE_OPEN_URI (see open_database)
+    query = QSqlQuery(db)
+    query.prepare("attach database ? as " + schema_name)
+    query.addBindValue(QUrl.fromLocalFile(db_path).toString() + "?mode=ro&immutable=1")
+    if not query.exec_():
+        logger.error("attach_database - Cannot attach " + db_path + " - " + query.lastError().text())
+        return False
+    if mmap_size and not query.exec_("pragma " + schema_name + ".mmap_size = " + str(mmap_size)):
+        logger.warning("attach_database - Cannot memory map " + db_path + " - " + query.lastError().text())
+    logger.info("attach_database - Database " + db_path + " attached as " + schema_name)
+    return True
+
+def get_bundled_file_path(file_name, extraction_folder):
+    # Return the path of a file bundled next to this module, or None if it is not bundled
+    # In apps built by pyqtdeploy, the package is embedded as Qt resources (`:/` paths) which SQLite
+    # cannot open: the file is then copied to the extraction folder, again only if its content changed
+    # (e.g. after an app upgrade) according to the digest stamped next to the copy
+    bundled_path = os.path.join(os.path.dirname(__file__), file_name)
+    if not bundled_path.startswith(":"):
+        return bundled_path if os.path.exists(bundled_path) else None
+    bundled_digest = get_file_digest(bundled_path)
+    if bundled_digest is None:
+        return None
+    extracted_path = os.path.join(extraction_folder, file_name)
+    stamp_path = extracted_path + ".sha256"
+    extracted_digest = None
+    if os.path.exists(extracted_path) and os.path.exists(stamp_path):
+        with open(stamp_path) as stamp_file:
+            extracted_digest = stamp_file.read().strip()
+    if extracted_digest != bundled_digest:
+        temporary_path = extracted_path + ".tmp"
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        if not QFile.copy(bundled_path, temporary_path):
+            logger.error("get_bundled_file_path - Cannot extract " + bundled_path)
+            return None
+        os.replace(temporary_path, extracted_path)
+        # Stamped once the copy is complete, so that an interrupted extraction is done again
+        with open(stamp_path, "w") as stamp_file:
+            stamp_file.write(bundled_digest)
+        logger.info("get_bundled_file_path - Extracted " + bundled_path + " to " + extracted_path)
+    return extracted_path
+
+def get_file_digest(file_path):
+    # Return the SHA-256 digest (hex) of a file, including Qt resources, or None if it cannot be read
+    bundled_file = QFile(file_path)
+    if not bundled_file.open(QIODevice.ReadOnly):
+        return None
+    file_hash = QCryptographicHash(QCryptographicHash.Sha256)
+    is_read = file_hash.addData(bundled_file)
+    bundled_file.close()
+    return bytes(file_hash.result().toHex()).decode() if is_read else None
+
+def bulk_insert(db, table_name, column_names, rows, chunk_size=1000):
+    # Insert an iterable of rows (sequences of values ordered as column_names)
+    # through one prepared statement, executed in batches of chunk_size rows,
+    # inside a single transaction.
+    # Return the number of inserted rows, or -1 if the insertion failed (and was rolled back).
+    if not db.transaction():
+        logger.error("bulk_insert - Cannot start transaction - " + db.lastError().text())
+        return -1
+
+    query = QSqlQuery(db)
+    placeholders = ", ".join("?" for _ in column_names)
+    if not query.prepare("insert into " + table_name
+            + " (" + ", ".join(column_names) + ") values (" + placeholders + ")"):
+        logger.error("bulk_insert - Cannot prepare statement - " + query.lastError().text())
+        db.rollback()
+        return -1
+
+    inserted_row_count = 0
+    chunk_columns = [[] for _ in column_names]
+    for row_number, row in enumerate(rows, 1):
+        # The bound lists must have the same length (execBatch reads past the end of shorter lists)
+        if len(row) != len(column_names):
+            logger.error("bulk_insert - Row " + str(row_number) + " has " + str(len(row)) + " values instead of "
+                    + str(len(column_names)))
+            db.rollback()
+            return -1
+        for column_values, value in zip(chunk_columns, row):
+            column_values.append(value)
+        if len(chunk_columns[0]) >= chunk_size:
+            if not exec_batch(query, chunk_columns):
+                db.rollback()
+                return -1
+            inserted_row_count += len(chunk_columns[0])
+            chunk_columns = [[] for _ in column_names]
+    if chunk_columns[0]:
+        if not exec_batch(query, chunk_columns):
+            db.rollback()
+            return -1
+        inserted_row_count += len(chunk_columns[0])
+
+    if not db.commit():
+        logger.error("bulk_insert - Cannot commit transaction - " + db.lastError().text())
+        db.rollback()
+        return -1
+
+    logger.info("bulk_insert - Inserted " + str(inserted_row_count) + " rows into " + table_name)
+    return inserted_row_count
+
+def exec_batch(query, column_values_list):
+    # Bind one list of values per column and execute the prepared query once for all of them
+    for column_values in column_values_list:
+        query.addBindValue(column_values)
+    if not query.execBatch():
+        logger.error("exec_batch - Batch execution failed - " + query.lastError().text())
+        return False
+    return True
+
+def record_startup_milestone(milestone):
+    # Append a timestamped startup milestone to the trace file requested by utils/startup_benchmark.py
+    startup_trace_path = os.environ.get("PYQT_CROM_STARTUP_TRACE")
+    if startup_trace_path:
+        with open(startup_trace_path, "a") as startup_trace_file:
+            startup_trace_file.write(milestone + " " + str(QDateTime.currentMSecsSinceEpoch()) + "\n")
+
 def main():
     logger.info("========================\n")
     logger.info("========================")
@@ -282,11 +1883,16 @@ def main():
     # Pass in sys.argv to allow command line arguments for the app: `QApplication(sys.argv)`
     # If command line arguments are not needed, use: `QApplication([])`
     app = QApplication(sys.argv)
+    record_startup_milestone("app_created")
 
     # Create a QMainWindow object which represents the Main Window.
     main_window = MainWindow()
+    record_startup_milestone("main_window_created")
     main_window.show()  # This line will show windows that are normally hidden.
     
+    # Record the first pass of the event loop (the app is then idle and ready for user input)
+    QTimer.singleShot(0, lambda: record_startup_milestone("event_loop_idle"))
+
     # Start the application event loop and handle the exit code
     logger.info("main - App started")
     sys.exit(app.exec())
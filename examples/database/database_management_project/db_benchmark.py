@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2023-2024 Achille MARTIN
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# ---- INTRODUCTION ----
+# Throughput benchmark suite of the database subsystem of the operational database app
+#
+# Two groups of benchmarks run headless (QT_QPA_PLATFORM=offscreen):
+# * profiles: each SQLite connection profile (see CONNECTION_PROFILES in the app)
+#   runs raw QSqlQuery workloads on a fresh file-backed database
+#   (single row commits, bulk insert, point reads, scan)
+# * dbmanager: the DbManager drives in-memory and file-backed databases
+#   (single / batched / transactional inserts, point lookups, range scans,
+#   model select() plus scrolling, edit commits)
+# Results are throughputs in operations (or rows) per second. They are saved
+# as JSON and can be compared against a baseline (results saved earlier with
+# the same --rows and --commits).
+# This script is not part of the app package: it is not deployed with the app.
+#
+# Usage example to measure a change:
+# python3 db_benchmark.py --output baseline.json
+# (apply the change)
+# python3 db_benchmark.py --baseline baseline.json --max-regression 10
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database_management_pkg'))
+
+from PyQt5.QtCore import QCoreApplication
+from PyQt5.QtSql import QSqlDatabase, QSqlQuery, QSqlTableModel
+import operational_pyqt5_app_with_database as dbapp
+
+
+def exec_or_raise(query, statement=None):
+    if not (query.exec_(statement) if statement is not None else query.exec_()):
+        raise Exception(query.lastError().text())
+
+
+def run_profile_workloads(db, row_count, commit_count):
+    """ Return the throughput (operations per second) of each workload on an open connection. """
+
+    results = {}
+    query = QSqlQuery(db)
+    exec_or_raise(query, "create table tennismen(id int primary key, firstname varchar(20), lastname varchar(20))")
+
+    start_time = time.perf_counter()
+    query.prepare("insert into tennismen (id, firstname, lastname) values (?, ?, ?)")
+    for row_id in range(commit_count):
+        query.addBindValue(row_id)
+        query.addBindValue('firstname' + str(row_id))
+        query.addBindValue('lastname' + str(row_id))
+        exec_or_raise(query)
+    results['commits'] = commit_count / (time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    db.transaction()
+    query.prepare("insert into tennismen (id, firstname, lastname) values (?, ?, ?)")
+    batch_size = 1000
+    for batch_start in range(commit_count, commit_count + row_count, batch_size):
+        row_ids = list(range(batch_start, min(batch_start + batch_size, commit_count + row_count)))
+        query.addBindValue(row_ids)
+        query.addBindValue(['firstname' + str(row_id) for row_id in row_ids])
+        query.addBindValue(['lastname' + str(row_id) for row_id in row_ids])
+        if not query.execBatch():
+            raise Exception(query.lastError().text())
+    db.commit()
+    results['bulk_insert'] = row_count / (time.perf_counter() - start_time)
+
+    total_row_count = commit_count + row_count
+    lookup_count = min(10000, total_row_count)
+    start_time = time.perf_counter()
+    query.prepare("select firstname, lastname from tennismen where id = ?")
+    for lookup_index in range(lookup_count):
+        query.addBindValue((lookup_index * 7919) % total_row_count)
+        exec_or_raise(query)
+        query.next()
+    results['point_reads'] = lookup_count / (time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    query.setForwardOnly(True)
+    exec_or_raise(query, "select id, firstname, lastname from tennismen")
+    while query.next():
+        query.value(0)
+    results['scan'] = total_row_count / (time.perf_counter() - start_time)
+    query.finish()
+    return results
+
+
+def benchmark_profile(profile_name, row_count, commit_count):
+    connection_name = "benchmark_" + profile_name
+    with tempfile.TemporaryDirectory() as db_folder:
+        db = QSqlDatabase.addDatabase('QSQLITE', connection_name)
+        db.setDatabaseName(os.path.join(db_folder, 'benchmark.db'))
+        if not dbapp.open_database(db, profile_name):
+            raise Exception(db.lastError().text())
+        try:
+            results = run_profile_workloads(db, row_count, commit_count)
+        finally:
+            db.close()
+            del db
+            QSqlDatabase.removeDatabase(connection_name)
+    return results
+
+
+def measure(operation_count, function):
+    """ Return the throughput (operations per second) of a function doing operation_count operations. """
+
+    start_time = time.perf_counter()
+    function()
+    return operation_count / (time.perf_counter() - start_time)
+
+
+def generate_rows(first_id, row_count):
+    return ((row_id, 'firstname' + str(row_id), 'lastname' + str(row_id))
+            for row_id in range(first_id, first_id + row_count))
+
+
+def run_db_manager_workloads(db_manager, row_count, commit_count):
+    """ Return the throughput of each workload driven through a DbManager. """
+
+    results = {}
+    db = db_manager.db_connected
+    insert_statement = "insert into tennismen (id, firstname, lastname) values (?, ?, ?)"
+    next_id = 1000
+
+    # Inserts: one commit per row, batches without transaction, batches in one transaction
+    def insert_single():
+        for row in generate_rows(next_id, commit_count):
+            db_manager.execute(insert_statement, row)
+    results['insert_single'] = measure(commit_count, insert_single)
+    next_id += commit_count
+
+    def insert_batched():
+        query = QSqlQuery(db)
+        query.prepare(insert_statement)
+        rows = list(generate_rows(next_id, commit_count))
+        dbapp.exec_batch(query, [list(column_values) for column_values in zip(*rows)])
+    results['insert_batched'] = measure(commit_count, insert_batched)
+    next_id += commit_count
+
+    results['insert_transactional'] = measure(row_count, lambda: db_manager.bulk_insert(
+            'tennismen', ['id', 'firstname', 'lastname'], generate_rows(next_id, row_count)))
+    next_id += row_count
+
+    # Reads: lookups by primary key and scans of key ranges
+    lookup_count = 10000
+    results['point_lookups'] = measure(lookup_count, lambda: [
+            db_manager.fetch_one("select firstname, lastname from tennismen where id = ?",
+                    [1000 + (lookup_index * 7919) % (next_id - 1000)])
+            for lookup_index in range(lookup_count)])
+    range_size = 100
+    range_count = 200
+    # The throughput counts the rows actually returned (the last ranges may be past the last id)
+    start_time = time.perf_counter()
+    scanned_row_count = sum(
+            len(list(db_manager.fetch_iter("select id, firstname, lastname from tennismen where id between ? and ?",
+                    [range_start, range_start + range_size - 1])))
+            for range_start in range(1000, 1000 + range_count * range_size, range_size))
+    results['range_scans'] = scanned_row_count / (time.perf_counter() - start_time)
+
+    # Models: select() then scrolling through every row of a model
+    table_row_count = db_manager.count_rows('tennismen')
+    def select_and_scroll(model):
+        if isinstance(model, QSqlTableModel):
+            model.select()
+            while model.canFetchMore():
+                model.fetchMore()
+        for row in range(model.rowCount()):
+            model.data(model.index(row, 1))
+    table_model = QSqlTableModel(None, db)
+    table_model.setTable('tennismen')
+    results['model_select_scroll'] = measure(table_row_count, lambda: select_and_scroll(table_model))
+    paged_model = dbapp.PagedTableModel(db, 'tennismen', 'id', ['id', 'firstname', 'lastname'])
+    results['paged_model_scroll'] = measure(table_row_count, lambda: select_and_scroll(paged_model))
+
+    # Edits: one commit per edit (OnFieldChange) versus write-behind
+    edit_count = min(commit_count, 1000)
+    field_change_model = QSqlTableModel(None, db)
+    db_manager.initialise_model(field_change_model, "id < " + str(1000 + edit_count))
+    results['edit_commits_field_change'] = measure(edit_count, lambda: [
+            field_change_model.setData(field_change_model.index(row, 2), 'edited' + str(row))
+            for row in range(edit_count)])
+    write_behind_model = dbapp.WriteBehindTableModel(os.path.join(db_manager.db_folder, 'benchmark-edits.jsonl'),
+            max_pending_edits=edit_count + 1)
+    db_manager.initialise_model(write_behind_model, "id < " + str(1000 + edit_count))
+    def edit_write_behind():
+        for row in range(edit_count):
+            write_behind_model.setData(write_behind_model.index(row, 2), 'rewritten' + str(row))
+        write_behind_model.flush()
+    results['edit_commits_write_behind'] = measure(edit_count, edit_write_behind)
+    return results
+
+
+def benchmark_db_manager(backend, row_count, commit_count):
+    with tempfile.TemporaryDirectory() as db_folder:
+        db_name = dbapp.IN_MEMORY_DB_NAME if backend == 'memory' else 'benchmark.db'
+        db_manager = dbapp.DbManager('QSQLITE', db_name, db_folder)
+        try:
+            results = run_db_manager_workloads(db_manager, row_count, commit_count)
+        finally:
+            # Release the application connection, so that the next backend gets a new one
+            connection_name = db_manager.db_connected.connectionName()
+            db_manager.close()
+            del db_manager
+            dbapp.DbManager.db_connected = None
+            gc.collect()
+            QSqlDatabase.removeDatabase(connection_name)
+    return results
+
+
+def run_suite(profile_names, backends, row_count, commit_count, repeat):
+    """ Return the median throughput of each benchmark, keyed by group.name.workload. """
+
+    samples = {}
+    for _ in range(repeat):
+        for profile_name in profile_names:
+            print(f"[INFO] Benchmarking connection profile {profile_name}", file=sys.stderr)
+            for workload, throughput in benchmark_profile(profile_name, row_count, commit_count).items():
+                samples.setdefault(f"profiles.{profile_name}.{workload}", []).append(throughput)
+        for backend in backends:
+            print(f"[INFO] Benchmarking DbManager with a {backend} database", file=sys.stderr)
+            for workload, throughput in benchmark_db_manager(backend, row_count, commit_count).items():
+                samples.setdefault(f"dbmanager.{backend}.{workload}", []).append(throughput)
+    return {name: statistics.median(throughputs) for name, throughputs in samples.items()}
+
+
+def compare_with_baseline(results, baseline):
+    """ Print the throughput change of each benchmark and return the largest regression (in %). """
+
+    largest_regression = 0.0
+    print("\n[INFO] Comparison against baseline (operations per second):")
+    for name, throughput in results.items():
+        baseline_throughput = baseline.get(name)
+        if not baseline_throughput:
+            print(f"    {name}: {throughput:.0f} (not in baseline)")
+            continue
+        change_percent = 100 * (throughput - baseline_throughput) / baseline_throughput
+        largest_regression = max(largest_regression, -change_percent)
+        print(f"    {name}: {baseline_throughput:.0f} -> {throughput:.0f} ({change_percent:+.1f}%)")
+    return largest_regression
+
+
+if __name__ == "__main__":
+    # Parse the command line.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles',
+            help="the connection profiles to benchmark [default: all]",
+            nargs='*',
+            choices=sorted(dbapp.CONNECTION_PROFILES),
+            default=list(dbapp.CONNECTION_PROFILES))
+    parser.add_argument('--backends',
+            help="the databases driven through DbManager [default: memory file]",
+            nargs='*',
+            choices=['memory', 'file'],
+            default=['memory', 'file'])
+    parser.add_argument('--rows', help="the number of rows of the bulk inserts [default: 100000]",
+            type=int, default=100000)
+    parser.add_argument('--commits', help="the number of single row transactions [default: 500]",
+            type=int, default=500)
+    parser.add_argument('--repeat', help="the number of runs whose median is kept [default: 1]",
+            type=int, default=1)
+    parser.add_argument('--output', help="the JSON file where results are saved", metavar="FILE")
+    parser.add_argument('--baseline', help="the JSON results to compare against", metavar="FILE")
+    parser.add_argument('--max-regression',
+            help="exit with an error if a throughput dropped by more than this percentage against the baseline",
+            metavar="PERCENT", type=float)
+    parser.add_argument('--json', help="print the results as JSON", action='store_true')
+    cmd_line_args = parser.parse_args()
+
+    baseline = None
+    if cmd_line_args.baseline:
+        if not os.path.exists(cmd_line_args.baseline):
+            print(f"[ERROR] Path to baseline file {cmd_line_args.baseline} does not exist.", file=sys.stderr)
+            sys.exit(2)
+        with open(cmd_line_args.baseline) as baseline_file:
+            baseline_data = json.load(baseline_file)
+        # Throughputs measured on different workload sizes are not comparable
+        baseline_settings = baseline_data.get('settings', {})
+        for setting_name in ('rows', 'commits'):
+            if baseline_settings.get(setting_name) != getattr(cmd_line_args, setting_name):
+                print(f"[ERROR] The baseline was measured with --{setting_name} "
+                        f"{baseline_settings.get(setting_name)} (not {getattr(cmd_line_args, setting_name)})",
+                        file=sys.stderr)
+                sys.exit(2)
+        baseline = baseline_data['results']
+
+    app = QCoreApplication(sys.argv)
+    try:
+        results = run_suite(cmd_line_args.profiles, cmd_line_args.backends,
+                cmd_line_args.rows, cmd_line_args.commits, max(cmd_line_args.repeat, 1))
+    except Exception as e:
+        print("[ERROR] Database benchmark failed")
+        print("Error message:\n" + str(e))
+        sys.exit(1)
+
+    if cmd_line_args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        print("Throughput (operations per second):")
+        for name, throughput in results.items():
+            print(f"    {name}: {throughput:.0f}")
+
+    if cmd_line_args.output:
+        with open(cmd_line_args.output, 'w') as output_file:
+            json.dump({
+                'settings': {'rows': cmd_line_args.rows, 'commits': cmd_line_args.commits,
+                        'repeat': cmd_line_args.repeat},
+                'results': results,
+            }, output_file, indent=4)
+        print(f"\n[INFO] Results saved to {cmd_line_args.output}", file=sys.stderr)
+
+    if baseline is not None:
+        largest_regression = compare_with_baseline(results, baseline)
+        if cmd_line_args.max_regression is not None and largest_regression > cmd_line_args.max_regression:
+            print(f"[ERROR] Throughput regression of {largest_regression:.1f}% "
+                    f"(more than {cmd_line_args.max_regression}%)", file=sys.stderr)
+            sys.exit(1)
@@ -28,6 +28,10 @@
 ## Imports
 
 from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QMessageBox
+from PyQt5.QtCore import QDateTime, QTimer
+
+# Only needed to record startup milestones for the startup benchmark
+import os
 
 # Only needed for access to command line arguments
 # import sys
@@ -59,16 +63,28 @@ class MainWindow(QMainWindow):
 
 ## Application definition
 
+def record_startup_milestone(milestone):
+    # Append a timestamped startup milestone to the trace file requested by utils/startup_benchmark.py
+    startup_trace_path = os.environ.get("PYQT_CROM_STARTUP_TRACE")
+    if startup_trace_path:
+        with open(startup_trace_path, "a") as startup_trace_file:
+            startup_trace_file.write(milestone + " " + str(QDateTime.currentMSecsSinceEpoch()) + "\n")
+
 def main():
     # Only one QApplication instance is needed per application.
     # Pass in sys.argv to allow command line arguments for the app: `QApplication(sys.argv)`
     # If command line arguments are not needed, use: `QApplication([])`
     app = QApplication([])
+    record_startup_milestone("app_created")
 
     # Create a QMainWindow object which represents the Main Window.
     main_window = MainWindow()
+    record_startup_milestone("main_window_created")
     main_window.showMaximized()  # This line will show windows that are normally hidden. Plus, it will maximise the main window.
 
+    # Record the first pass of the event loop (the app is then idle and ready for user input)
+    QTimer.singleShot(0, lambda: record_startup_milestone("event_loop_idle"))
+
     # Start the application event loop.
     app.exec()
 
@@ -29,10 +29,13 @@
 ## Imports
 
 from PyQt5.QtWidgets import QApplication, QMainWindow, QGraphicsScene, QGraphicsView, QGraphicsRectItem, QGraphicsEllipseItem, QGraphicsItem, QStatusBar, QLabel, QGridLayout, QPushButton, QWidget, QMessageBox, QStackedLayout, QVBoxLayout
-from PyQt5.QtGui import QBrush, QPen, QPainter
-from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QBrush, QPen, QPainter, QColor
+from PyQt5.QtCore import Qt, QDateTime, QTimer, QRectF, QPointF
 
 import sys
+import random
+from array import array
+from bisect import bisect_right
 import os.path # To manage file paths for cross-platform apps
 import logging as log_tool # The logging library for debugging
 
@@ -59,6 +62,210 @@ logger.addHandler(file_handler)
 
 ## Class definition
 
+# Minimum delay (in ms) between two updates of the status bar (about one frame at 60 fps)
+STATUS_BAR_UPDATE_INTERVAL = 16
+
+# Mixin for graphics items reporting their position changes
+# Note: the item must have the ItemSendsGeometryChanges flag (see MainWindow::track_item)
+class TrackedItem():
+    on_position_change = None
+
+    def itemChange(self, change, value):
+        if change == QGraphicsItem.ItemPositionHasChanged and self.on_position_change is not None:
+            self.on_position_change(self)
+        return super().itemChange(change, value)
+
+class TrackedRectItem(TrackedItem, QGraphicsRectItem):
+    pass
+
+class TrackedEllipseItem(TrackedItem, QGraphicsEllipseItem):
+    pass
+
+# Size (in scene units) of the cells of the spatial grid of a ShapeBatchItem
+SHAPE_GRID_CELL_SIZE = 32
+# Shapes smaller than this (in pixels) are painted as rectangles (they are hardly distinguishable)
+SHAPE_MIN_ELLIPSE_SIZE = 6
+
+# Number of points plotted by the graphics playground
+SCATTER_POINT_COUNT = 100000
+SCATTER_POINT_SIZE = 1.5
+SCATTER_POINT_COLOURS = [Qt.darkBlue, Qt.darkGreen, Qt.darkRed, Qt.darkMagenta]
+# Grid cells holding a few points each
+SCATTER_GRID_CELL_SIZE = 4
+
+# Single scene item painting many simple shapes (rectangles and ellipses)
+# The shapes are stored in arrays (instead of one QGraphicsItem each) and indexed by a spatial grid,
+# so that only the shapes in the exposed area are painted (grouped by colour) and hit-tested
+class ShapeBatchItem(QGraphicsItem):
+    RECT = 0
+    ELLIPSE = 1
+
+    def __init__(self, cell_size=SHAPE_GRID_CELL_SIZE, parent=None):
+        super().__init__(parent)
+        self.cell_size = cell_size
+        # Geometry, colour (ARGB) and kind of the shapes, by index
+        self.xs = array('d')
+        self.ys = array('d')
+        self.widths = array('d')
+        self.heights = array('d')
+        self.colours = array('I')
+        self.kinds = array('B')
+        # Indices of the shapes by grid cell of their top-left corner
+        # Note: the searched area is extended by the largest shape, so that overlapping shapes are found
+        self.grid = {}
+        self.max_width = 0
+        self.max_height = 0
+        self.bounding_rect = QRectF()
+        # Painting resources, built on demand
+        self.brushes = {}
+        # Sorted distinct sizes (smallest side) of the shapes, and the indices of the shapes of the whole item
+        # grouped by colour for each range of sizes painted as rectangles (which only changes when the zoom
+        # crosses a shape size)
+        # Note: the rects are only built for the shapes painted, they are not kept
+        self.shape_sizes = []
+        self.shape_groups = {}
+        # Shape selected by a click, and function called with this item and the index of the shape
+        self.selected_index = None
+        self.on_shape_selected = None
+        # Provide the exposed rect of the view in paint (for culling)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def add_shapes(self, shapes):
+        # Add an iterable of shapes (x, y, width, height, colour, kind) and return the index of the first one
+        self.prepareGeometryChange()
+        first_index = len(self.xs)
+        index = first_index
+        cell_size = self.cell_size
+        shape_sizes = set(self.shape_sizes)
+        for x, y, width, height, colour, kind in shapes:
+            self.xs.append(x)
+            self.ys.append(y)
+            self.widths.append(width)
+            self.heights.append(height)
+            self.colours.append(QColor(colour).rgba())
+            self.kinds.append(kind)
+            if kind == ShapeBatchItem.ELLIPSE:
+                shape_sizes.add(min(width, height))
+            self.grid.setdefault((int(x // cell_size), int(y // cell_size)), array('I')).append(index)
+            self.max_width = max(self.max_width, width)
+            self.max_height = max(self.max_height, height)
+            self.bounding_rect = self.bounding_rect.united(QRectF(x, y, width, height))
+            index += 1
+        self.shape_sizes = sorted(shape_sizes)
+        self.shape_groups = {}
+        self.update()
+        return first_index
+
+    def add_shape(self, x, y, width, height, colour, kind=RECT):
+        return self.add_shapes([(x, y, width, height, colour, kind)])
+
+    def shape_count(self):
+        return len(self.xs)
+
+    def get_shape_rect(self, index):
+        return QRectF(self.xs[index], self.ys[index], self.widths[index], self.heights[index])
+
+    def get_shape_centre(self, index):
+        return QPointF(self.xs[index] + self.widths[index]/2, self.ys[index] + self.heights[index]/2)
+
+    def shapes_in_rect(self, rect):
+        # Return the indices of the shapes intersecting a rect (in item coordinates), in painting order
+        if rect.contains(self.bounding_rect):
+            return range(len(self.xs))
+        left, top, right, bottom = rect.left(), rect.top(), rect.right(), rect.bottom()
+        cell_size = self.cell_size
+        indices = []
+        for column in range(int((left - self.max_width) // cell_size), int(right // cell_size) + 1):
+            for row in range(int((top - self.max_height) // cell_size), int(bottom // cell_size) + 1):
+                cell_indices = self.grid.get((column, row))
+                if cell_indices is None:
+                    continue
+                for index in cell_indices:
+                    x, y = self.xs[index], self.ys[index]
+                    if x <= right and y <= bottom and x + self.widths[index] >= left and y + self.heights[index] >= top:
+                        indices.append(index)
+        indices.sort()
+        return indices
+
+    def shape_at(self, point):
+        # Return the index of the topmost shape containing a point (in item coordinates), or None
+        x, y = point.x(), point.y()
+        for index in reversed(self.shapes_in_rect(QRectF(x, y, 0, 0))):
+            if self.kinds[index] == ShapeBatchItem.RECT:
+                return index
+            # Point in the ellipse inscribed in the rect of the shape
+            radius_x, radius_y = self.widths[index]/2, self.heights[index]/2
+            if radius_x > 0 and radius_y > 0 and (((x - self.xs[index] - radius_x) / radius_x) ** 2
+                    + ((y - self.ys[index] - radius_y) / radius_y) ** 2) <= 1:
+                return index
+        return None
+
+    def boundingRect(self):
+        return self.bounding_rect
+
+    def contains(self, point):
+        # Let the clicks outside of the shapes through to the items below
+        return self.shape_at(point) is not None
+
+    def paint(self, painter, option, widget=None):
+        # Small shapes are painted as rectangles, in one call per colour
+        level_of_detail = option.levelOfDetailFromTransform(painter.worldTransform())
+        min_ellipse_size = SHAPE_MIN_ELLIPSE_SIZE / level_of_detail if level_of_detail > 0 else float('inf')
+        # The exposed rect is aligned to pixels: the item is fully exposed if it is within one pixel of it
+        pixel_size = 1 / level_of_detail if level_of_detail > 0 else 0
+        exposed_rect = option.exposedRect.adjusted(-pixel_size, -pixel_size, pixel_size, pixel_size)
+        if exposed_rect.contains(self.bounding_rect):
+            size_range = bisect_right(self.shape_sizes, min_ellipse_size)
+            if size_range not in self.shape_groups:
+                self.shape_groups[size_range] = self.group_shapes(range(len(self.xs)), min_ellipse_size)
+            rects_by_colour, ellipses_by_colour = self.shape_groups[size_range]
+        else:
+            rects_by_colour, ellipses_by_colour = self.group_shapes(self.shapes_in_rect(exposed_rect), min_ellipse_size)
+
+        painter.setPen(Qt.NoPen)
+        xs, ys, widths, heights = self.xs, self.ys, self.widths, self.heights
+        for colour in set(rects_by_colour) | set(ellipses_by_colour):
+            brush = self.brushes.get(colour)
+            if brush is None:
+                brush = self.brushes[colour] = QBrush(QColor.fromRgba(colour))
+            painter.setBrush(brush)
+            if colour in rects_by_colour:
+                painter.drawRects([QRectF(xs[index], ys[index], widths[index], heights[index])
+                        for index in rects_by_colour[colour]])
+            for index in ellipses_by_colour.get(colour, ()):
+                painter.drawEllipse(QRectF(xs[index], ys[index], widths[index], heights[index]))
+
+        if self.selected_index is not None:
+            pen = QPen(Qt.yellow)
+            pen.setCosmetic(True)
+            painter.setPen(pen)
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(self.get_shape_rect(self.selected_index))
+
+    def group_shapes(self, indices, min_ellipse_size):
+        # Return the indices of the shapes painted as rectangles and as ellipses, by colour
+        rects_by_colour = {}
+        ellipses_by_colour = {}
+        colours, kinds, widths, heights = self.colours, self.kinds, self.widths, self.heights
+        for index in indices:
+            if kinds[index] == ShapeBatchItem.ELLIPSE and min(widths[index], heights[index]) >= min_ellipse_size:
+                ellipses_by_colour.setdefault(colours[index], array('I')).append(index)
+            else:
+                rects_by_colour.setdefault(colours[index], array('I')).append(index)
+        return rects_by_colour, ellipses_by_colour
+
+    def mousePressEvent(self, event):
+        index = self.shape_at(event.pos())
+        if index is None:
+            event.ignore()
+            return
+        if self.selected_index is not None:
+            self.update(self.get_shape_rect(self.selected_index).adjusted(-1, -1, 1, 1))
+        self.selected_index = index
+        self.update(self.get_shape_rect(index).adjusted(-1, -1, 1, 1))
+        if self.on_shape_selected is not None:
+            self.on_shape_selected(self, index)
+
 # Subclass QMainWindow to customize your application's main window
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -80,6 +287,13 @@ class MainWindow(QMainWindow):
         self.stacked_layout_dict = {} # Dict mapping screen index with screen name
         main_window_layout.addLayout(self.stacked_layout)
         
+        # Selected item displayed in the status bar, updated at most once per frame
+        self.selected_tracked_item = None
+        self.status_bar_update_timer = QTimer(self)
+        self.status_bar_update_timer.setSingleShot(True)
+        self.status_bar_update_timer.setInterval(STATUS_BAR_UPDATE_INTERVAL)
+        self.status_bar_update_timer.timeout.connect(self.update_status_bar)
+
         # Create components of the main window
         self.create_home_page()
         self.create_graphics_visualiser()
@@ -177,6 +391,8 @@ class MainWindow(QMainWindow):
         # Define control buttons
         home_button = QPushButton("Go to Home Page")
         home_button.clicked.connect(self.on_home_button_clicked)
+        self.plot_button = QPushButton("Plot " + str(SCATTER_POINT_COUNT) + " points")
+        self.plot_button.clicked.connect(self.on_plot_button_clicked)
 
         # Define a scene for the Graphics
 
@@ -202,7 +418,7 @@ class MainWindow(QMainWindow):
         y_axis_pos.setBrush(QBrush(Qt.black))
 
         # Draw a rectangle item with top-left corner at (0, 0) and set its dimensions (w, h)
-        rect = QGraphicsRectItem(0, 0, 200, 50)
+        rect = TrackedRectItem(0, 0, 200, 50)
 
         # Set the origin of the rectangle in the scene.
         rect.setPos(50, 20)
@@ -215,7 +431,7 @@ class MainWindow(QMainWindow):
         rect.setPen(pen_rect)
 
         # Draw an ellipse item at (0, 0) and set its dimensions (a, b)
-        ellipse = QGraphicsEllipseItem(0, 0, 100, 100)
+        ellipse = TrackedEllipseItem(0, 0, 100, 100)
 
         # Set the origin of the ellipse in the scene
         ellipse.setPos(75, 50)
@@ -255,12 +471,22 @@ class MainWindow(QMainWindow):
         # Perform operations on the items
         # self.rect.setRotation(45)
 
-        # Track position of an object
-        # print(self.ellipse.ItemPositionChange)
+        # Track position of the selected object
+        # Only the selection changes and the moves of the tracked items are handled
+        # (instead of every scene change), so the cost does not grow with the number of items
         # Standard events related to the scene can be found at:
         # https://doc.qt.io/qtforpython-5/PySide2/QtWidgets/QGraphicsScene.html
-        scene.changed.connect(lambda: self.on_scene_change(scene, rect))
-        scene.changed.connect(lambda: self.on_scene_change(scene, ellipse))
+        self.track_item(rect)
+        self.track_item(ellipse)
+        scene.selectionChanged.connect(lambda: self.on_selection_change(scene))
+
+        # Define a batch of points (painted by a single item), plotted on demand
+        self.scatter_plot = ShapeBatchItem(SCATTER_GRID_CELL_SIZE)
+        self.scatter_plot.setZValue(0.5)
+        self.scatter_plot.on_shape_selected = self.on_batch_shape_selected
+        scene.addItem(self.scatter_plot)
+        # The scene reports the removal of the selected items while it is destroyed at exit
+        QApplication.instance().aboutToQuit.connect(scene.selectionChanged.disconnect)
         
         # Define a view for the Graphics
 
@@ -273,6 +499,7 @@ class MainWindow(QMainWindow):
         # Update the widgets in the selected layout
         graphics_screen_layout.addWidget(home_button, 0, 1, 1, 1)
         graphics_screen_layout.addWidget(view, 1, 0, 1, 3)
+        graphics_screen_layout.addWidget(self.plot_button, 2, 1, 1, 1)
         graphics_screen_layout.setRowStretch(0, 0)
         graphics_screen_layout.setColumnStretch(0, 1)
         graphics_screen_layout.setColumnStretch(2, 1)
@@ -325,23 +552,79 @@ class MainWindow(QMainWindow):
             self.status_bar.setVisible(False) # Make status bar invisible
             self.stacked_layout.setCurrentIndex(self.stacked_layout_dict["home"])
 
-    def on_scene_change(self, scene, item):
-
-        logger.debug("MainWindow::on_scene_change - Entered method")
-
-        # print("Scene changes")
-        if item in scene.selectedItems():
-
-            item_centre_x = item.pos().x() + item.rect().width()/2
-            item_centre_y = item.pos().y() + item.rect().height()/2 
+    def track_item(self, item):
+        # Report the moves of a tracked item (flag set after the other flags of the item)
+        item.setFlag(QGraphicsItem.ItemSendsGeometryChanges)
+        item.on_position_change = self.on_tracked_item_moved
+
+    def on_selection_change(self, scene):
+        selected_tracked_items = [item for item in scene.selectedItems() if isinstance(item, TrackedItem)]
+        if selected_tracked_items:
+            self.selected_tracked_item = selected_tracked_items[0]
+            self.schedule_status_bar_update()
+
+    def on_tracked_item_moved(self, item):
+        if item.isSelected():
+            self.selected_tracked_item = item
+            self.schedule_status_bar_update()
+
+    def on_batch_shape_selected(self, batch_item, index):
+        self.selected_tracked_item = batch_item
+        self.schedule_status_bar_update()
+
+    def on_plot_button_clicked(self):
+
+        logger.debug("MainWindow::on_plot_button_clicked - Entered method")
+
+        # Scatter the points over the scene rect
+        scene_rect = self.scatter_plot.scene().sceneRect()
+        random_generator = random.Random(self.scatter_plot.shape_count())
+        self.scatter_plot.add_shapes(
+                (scene_rect.left() + random_generator.random() * scene_rect.width(),
+                        scene_rect.top() + random_generator.random() * scene_rect.height(),
+                        SCATTER_POINT_SIZE, SCATTER_POINT_SIZE,
+                        SCATTER_POINT_COLOURS[index % len(SCATTER_POINT_COLOURS)], ShapeBatchItem.ELLIPSE)
+                for index in range(SCATTER_POINT_COUNT))
+        self.plot_button.setText("Plot " + str(SCATTER_POINT_COUNT) + " more points ("
+                + str(self.scatter_plot.shape_count()) + " plotted)")
+        logger.info("MainWindow::on_plot_button_clicked - " + str(self.scatter_plot.shape_count()) + " points plotted")
+
+        logger.debug("MainWindow::on_plot_button_clicked - Exited method")
+
+    def schedule_status_bar_update(self):
+        # Coalesce the updates requested during a frame
+        if not self.status_bar_update_timer.isActive():
+            self.status_bar_update_timer.start()
+
+    def update_status_bar(self):
+
+        logger.debug("MainWindow::update_status_bar - Entered method")
+
+        item = self.selected_tracked_item
+        if item is not None and item.scene() is not None:
+
+            if isinstance(item, ShapeBatchItem):
+                item_centre = item.mapToScene(item.get_shape_centre(item.selected_index))
+                item_centre_x = item_centre.x()
+                item_centre_y = item_centre.y()
+            else:
+                item_centre_x = item.pos().x() + item.rect().width()/2
+                item_centre_y = item.pos().y() + item.rect().height()/2 
 
             self.status_bar_text = "Selected item centre coordinates: ({}, {})".format(round(item_centre_x, 2), round(item_centre_y, 2))
             self.object_centre_tracker_label.setText(self.status_bar_text)
 
-        logger.debug("MainWindow::on_scene_change - Exited method")
+        logger.debug("MainWindow::update_status_bar - Exited method")
 
 ## Application definition
 
+def record_startup_milestone(milestone):
+    # Append a timestamped startup milestone to the trace file requested by utils/startup_benchmark.py
+    startup_trace_path = os.environ.get("PYQT_CROM_STARTUP_TRACE")
+    if startup_trace_path:
+        with open(startup_trace_path, "a") as startup_trace_file:
+            startup_trace_file.write(milestone + " " + str(QDateTime.currentMSecsSinceEpoch()) + "\n")
+
 def main():
     logger.info("========================\n")
     logger.info("========================")
@@ -352,10 +635,15 @@ def main():
     # Pass in sys.argv to allow command line arguments for the app: `QApplication(sys.argv)`
     # If command line arguments are not needed, use: `QApplication([])`
     app = QApplication(sys.argv)
+    record_startup_milestone("app_created")
 
     # Create a QMainWindow object which represents the Main Window.
     main_window = MainWindow()
+    record_startup_milestone("main_window_created")
     
+    # Record the first pass of the event loop (the app is then idle and ready for user input)
+    QTimer.singleShot(0, lambda: record_startup_milestone("event_loop_idle"))
+
     # Start the application event loop and handle the exit code
     logger.info("main - App started")
     sys.exit(app.exec())
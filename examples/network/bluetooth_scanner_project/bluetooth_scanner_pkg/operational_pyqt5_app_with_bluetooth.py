@@ -30,7 +30,7 @@
 # For instance: pyqtSignal(str) to pass a string
 
 from PyQt5.QtWidgets import QApplication, QMainWindow, QStatusBar, QLabel, QGridLayout, QPushButton, QWidget, QMessageBox
-from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtCore import QObject, pyqtSignal, QDateTime, QTimer
 from PyQt5.QtBluetooth import QBluetoothDeviceDiscoveryAgent, QBluetoothDeviceInfo, QBluetoothLocalDevice
 
 import sys
@@ -439,6 +439,13 @@ class BluetoothScanner(QObject):
 
 ## Application definition
 
+def record_startup_milestone(milestone):
+    # Append a timestamped startup milestone to the trace file requested by utils/startup_benchmark.py
+    startup_trace_path = os.environ.get("PYQT_CROM_STARTUP_TRACE")
+    if startup_trace_path:
+        with open(startup_trace_path, "a") as startup_trace_file:
+            startup_trace_file.write(milestone + " " + str(QDateTime.currentMSecsSinceEpoch()) + "\n")
+
 def main():
     logger.info("========================\n")
     logger.info("========================")
@@ -447,10 +454,15 @@ def main():
 
     # Define the app object/instance
     app = QApplication(sys.argv)
+    record_startup_milestone("app_created")
     
     # Create a Qt widget, which is going to be the main window.
     main_window = MainWindow()
+    record_startup_milestone("main_window_created")
     
+    # Record the first pass of the event loop (the app is then idle and ready for user input)
+    QTimer.singleShot(0, lambda: record_startup_milestone("event_loop_idle"))
+
     # Start the event loop and handle the exit code
     logger.info("main - App started")
     sys.exit(app.exec())
@@ -27,23 +27,34 @@
 import argparse
 import os
 import shutil
-import subprocess
 import sys
 import time
 import pdt_parser as pdtp
+import build_cache as bcache
+import build_lock as blk
+import build_logs as blogs
+import build_progress as bprog
+import pdt_manifest as pdtm
+import pdt_validator as pdtv
 from datetime import datetime
 
 
-def run(args):
-    """ Run a command and terminate if it fails. """
+def run(args, stage_name):
+    """ Run a command, log its output for the stage and terminate if it fails. """
 
     try:
-        ec = subprocess.call(' '.join(args), shell=True)
+        progress = bprog.create_stage_progress(stage_name, log_dir, progress_file, display=not quiet)
+        ec = blogs.run_logged(args, stage_name, log_dir, progress=progress)
     except OSError as e:
         print("Execution failed:", e, file=sys.stderr)
         ec = 1
 
     if ec:
+        print(f"[ERROR] Stage {stage_name} failed. The build logs can be found in {log_dir}", file=sys.stderr)
+        first_error = blogs.find_first_error(log_dir, stage_name)
+        if first_error:
+            print(f"[ERROR] First error found in stage {first_error[0]} at line {first_error[1]}. "
+                    f"Run build_logs.py --log-dir {log_dir} to show it.", file=sys.stderr)
         sys.exit(ec)
 
 
@@ -61,11 +72,20 @@ parser.add_argument('--qmake',
         help="the qmake executable when using an existing Qt installation",
         metavar="FILE")
 parser.add_argument('--target', help="the target architecture", default='')
+parser.add_argument('--update-package-content',
+        help="Update the package Content entries of the .pdt file from the package folder before building",
+        action='store_true')
 parser.add_argument('--reload-sysroot',
         help="Delete existing sysroot build folder and load target sysroot file",
         action='store_true')
+parser.add_argument('--skip-validation',
+        help="Do not validate the project before building",
+        action='store_true')
 parser.add_argument('--quiet', help="disable progress messages",
         action='store_true')
+parser.add_argument('--progress-file',
+        help="a file to which machine-readable progress events (JSON lines) are appended",
+        metavar="FILE")
 parser.add_argument('--verbose', help="enable verbose progress messages",
         action='store_true')
 cmd_line_args = parser.parse_args()
@@ -78,8 +98,11 @@ jobs = cmd_line_args.jobs
 qmake = os.path.abspath(cmd_line_args.qmake) if cmd_line_args.qmake else None
 target = cmd_line_args.target
 reload_sysroot = cmd_line_args.reload_sysroot
+update_package_content = cmd_line_args.update_package_content
+skip_validation = cmd_line_args.skip_validation
 quiet = cmd_line_args.quiet
 verbose = cmd_line_args.verbose
+progress_file = os.path.abspath(cmd_line_args.progress_file) if cmd_line_args.progress_file else None
 
 # State script args for debugging
 print("\n----- REVIEWING COMMAND-LINE ARGS -----\n")
@@ -87,8 +110,11 @@ print(f"[INFO] The .pdt path received is: {pdt}")
 print(f"[INFO] The number of jobs received is: {jobs}")
 print(f"[INFO] The qmake path received is: {qmake}")
 print(f"[INFO] The request to reload the sysroot is: {reload_sysroot}")
+print(f"[INFO] The request to update the package content is: {update_package_content}")
+print(f"[INFO] The request to skip the project validation is: {skip_validation}")
 print(f"[INFO] The request to disable progress messages is: {quiet}")
 print(f"[INFO] The request to enable verbose progress messages is: {verbose}")
+print(f"[INFO] The progress events file received is: {progress_file}")
 
 print("\n----- INITIALISING AND COLLECTING VARIABLES -----\n")
 
@@ -98,8 +124,17 @@ pdt_dir = os.path.dirname(os.path.abspath(pdt))
 print(f"[INFO] Pdt directory location is: {pdt_dir}. This is the reference directory.")
 ## Define default variable values
 app_name_default = "MyCrossPlatformApp"
-## Instantiate pdt_parser object
+## Update the package Content entries of the pdt if requested
 pdt_path = pdt
+if update_package_content:
+    try:
+        if pdtm.update_package_contents(pdt_path):
+            print(f"[INFO] Updated the package content of {pdt_path}")
+    except Exception as e:
+        print("[ERROR] Cannot update the application package content")
+        print("Error message:\n" + str(e))
+        sys.exit(1)
+## Instantiate pdt_parser object
 pdt_parser = pdtp.PdtParser(pdt_path)
 ## Get essential information from pdt file
 sysroot_path = pdt_parser.get_sysroot_path()
@@ -158,15 +193,43 @@ else:
         print("--qmake must not be specified for", target, file=sys.stderr)
         sys.exit(2)
 
+# Fail fast on project mistakes, before any expensive build stage
+if not skip_validation:
+    print("\n----- VALIDATING THE PROJECT -----\n")
+    if not pdtv.report_problems(pdtv.validate_project(pdt_path, target)):
+        print("[ERROR] The project is not valid. Fix the errors above (or use --skip-validation).", file=sys.stderr)
+        sys.exit(1)
+
 # Anchor everything from the directory containing this script.
 os.chdir(pdt_dir)
 
+# Store the output of each build stage in compressed and indexed logs
+log_dir = os.path.join(pdt_dir, 'logs-' + target, str(current_datetime))
+print(f"[INFO] The build logs dir is set to: {log_dir}")
+
 print("\n----- BUILDING TARGET SYSROOT -----\n")
 
+# Lock the build folder for the whole build and the sysroot for reading.
+# Concurrent builds of the same project (or sharing a sysroot) wait in a queue.
+# The build folder is always locked first to keep a consistent lock order.
+build_dir = 'build-' + target
+build_lock = blk.lock_folder(build_dir, blk.EXCLUSIVE)
+sysroot_lock = blk.lock_folder('sysroot-' + target, blk.SHARED)
+
+def is_sysroot_built():
+    """ Check whether the sysroot has been built from the current sysroot file. """
+
+    return (bcache.read_cache_stamp('sysroot-' + target)
+            == bcache.compute_sysroot_fingerprint(sysroot_path, target))
+
 # Build the sysroot.
 # This won't do anything if it is already built.
 # Unless the reload_sysroot flag is set to True.
 
+if reload_sysroot or not is_sysroot_built():
+    # Only one build at a time can write into the sysroot
+    sysroot_lock.acquire(blk.EXCLUSIVE)
+
 if reload_sysroot:
     shutil.rmtree('sysroot-' + target)
     shutil.rmtree('build-' + target)
@@ -189,13 +252,26 @@ if verbose:
 
 args.append(sysroot_path)
 
-run(args)
+# Another build may have completed the sysroot while this one was queued
+if reload_sysroot or not is_sysroot_built():
+    run(args, '1-sysroot')
+
+    # Stamp the sysroot with the fingerprint of its inputs (for disk usage management)
+    bcache.write_cache_stamp('sysroot-' + target,
+            bcache.compute_sysroot_fingerprint(sysroot_path, target))
+else:
+    print(f"[INFO] The sysroot {os.path.abspath('sysroot-' + target)} is already built")
+
+    # Record the reuse, so that the least recently used sysroots are evicted first
+    bcache.touch_cache_stamp('sysroot-' + target,
+            bcache.compute_sysroot_fingerprint(sysroot_path, target))
+
+# Let other builds use the finished sysroot
+sysroot_lock.acquire(blk.SHARED)
 
 print("\n----- BUILDING THE PYQTDEPLOY PROJECT -----\n")
 
 # Build the pyqtdeploy project
-build_dir = 'build-' + target
-
 args = ['pyqtdeploy-build', '--target', target, '--build-dir', build_dir]
 
 if qmake:
@@ -210,7 +286,11 @@ if verbose:
 
 args.append(pdt_path)
 
-run(args)
+run(args, '2-pyqtdeploy-build')
+
+# Stamp the build folder with the fingerprint of its inputs (for disk usage management)
+bcache.write_cache_stamp(build_dir,
+        bcache.compute_build_fingerprint(pdt_path, sysroot_path, target))
 
 print("\n----- RUNNING QMAKE -----\n")
 
@@ -225,7 +305,7 @@ if not os.path.isfile(qmake_path):
     qmake_path = qmake
 
 os.chdir(build_dir)
-run([qmake_path])
+run([qmake_path], '3-qmake')
 
 # Run make. (When targeting iOS we leave it to Xcode.)
 if target.startswith('ios'):
@@ -234,21 +314,21 @@ else:
     # We only support MSVC on Windows.
     make = 'nmake' if sys.platform == 'win32' else 'make'
 
-    run([make])
+    run([make], '4-make')
 
     if target.startswith('android'):
         if os.path.isfile('android-' + app_name + '-deployment-settings.json'):
             # Qt v5.14 or later.
-            run([make, 'apk'])
+            run([make, 'apk'], '5-make-apk')
             apk = app_name + '.apk'
             apk_dir = os.path.join(pdt_dir, build_dir, 'android-build')
         else:
             # Qt v5.13 or earlier.
-            run([make, 'INSTALL_ROOT=' + app_entrypoint_name, 'install'])
+            run([make, 'INSTALL_ROOT=' + app_entrypoint_name, 'install'], '5-make-install')
             run([os.path.join(os.path.dirname(qmake_path), 'androiddeployqt'),
                     '--gradle', '--input',
                     'android-lib' + app_name + '.so-deployment-settings.json',
-                    '--output', app_entrypoint_name])
+                    '--output', app_entrypoint_name], '6-androiddeployqt')
             apk = app_entrypoint_name + '-debug.apk'
             apk_dir = os.path.join(pdt_dir, build_dir, app_entrypoint_name, 'build', 'outputs',
                     'apk', 'debug')
@@ -285,3 +365,9 @@ else:
     shutil.copy(os.path.join(pdt_dir, build_dir, app_entrypoint_name), app_release_dir)
     print(f"The released app {app_entrypoint_name} can be found in {os.path.abspath(app_release_dir)}\n")
     print(f"Debug tip: the {app_entrypoint_name} executable can be found in the '{build_dir}' directory.")
+    if target.startswith('linux'):
+        print(f"Benchmark tip: run startup_benchmark.py --pdt {pdt_path} to measure the startup time of this release.")
+
+# Let queued builds proceed
+sysroot_lock.release()
+build_lock.release()
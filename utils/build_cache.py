@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2023-2024 Achille MARTIN
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# ---- INTRODUCTION ----
+# Disk usage management of the build-<target> and sysroot-<target> folders
+#
+# build_app.py stamps each folder it uses with the fingerprint of the inputs
+# it was built from (the stamp modification time records the last use).
+# A folder is referenced when its stamp matches the fingerprint of the current
+# inputs of its project: referenced folders are never evicted.
+# Eviction happens in least-recently-used order, until the quota is met:
+# * first, unreferenced (stale or unstamped) folders are deleted
+# * then, intermediate objects of referenced folders are deleted
+
+import argparse
+import fnmatch
+import hashlib
+import os
+import shutil
+import sys
+import time
+import pdt_parser as pdtp
+import sysroot_parser as sysp
+import build_lock as blk
+
+CACHE_STAMP_FILE_NAME = ".pyqt_crom_cache_stamp"
+INTERMEDIATE_OBJECT_PATTERNS = ["*.o", "*.obj"]
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+class CacheEntry():
+    def __init__(self, pdt_path, path, kind, target):
+        self.pdt_path = pdt_path
+        self.path = path
+        # Kind is either 'sysroot' or 'build'
+        self.kind = kind
+        self.target = target
+        self.size = get_disk_usage(path)
+        self.last_used = get_last_use_time(path)
+        cache_stamp = read_cache_stamp(path)
+        self.referenced = (cache_stamp is not None
+                and cache_stamp == compute_fingerprint(pdt_path, kind, target))
+
+
+def hash_file(file_path, hasher):
+    with open(file_path, 'rb') as file_object:
+        for chunk in iter(lambda: file_object.read(1024 * 1024), b''):
+            hasher.update(chunk)
+
+
+def compute_sysroot_fingerprint(sysroot_path, target):
+    """ Fingerprint the inputs of a sysroot-<target> folder (the sysroot options resolved for the target). """
+
+    return sysp.compute_fingerprints(sysroot_path, target)['sysroot']
+
+
+def compute_build_fingerprint(pdt_path, sysroot_path, target):
+    """ Fingerprint the inputs of a build-<target> folder. """
+
+    hasher = hashlib.sha256()
+    hasher.update(compute_sysroot_fingerprint(sysroot_path, target).encode())
+    hash_file(pdt_path, hasher)
+    return hasher.hexdigest()
+
+
+def compute_fingerprint(pdt_path, kind, target):
+    # The parser exits when the sysroot file declared in the pdt cannot be found,
+    # unreadable files raise OSError, and the TOML decode errors (tomllib and toml)
+    # as well as unknown targets raise ValueError
+    try:
+        sysroot_path = pdtp.PdtParser(pdt_path).get_sysroot_path()
+        if kind == 'sysroot':
+            return compute_sysroot_fingerprint(sysroot_path, target)
+        return compute_build_fingerprint(pdt_path, sysroot_path, target)
+    except (SystemExit, OSError, ValueError):
+        return None
+
+
+def write_cache_stamp(folder_path, fingerprint):
+    """ Record the fingerprint of a folder and mark it as used now. """
+
+    with open(os.path.join(folder_path, CACHE_STAMP_FILE_NAME), 'w') as stamp_file:
+        stamp_file.write(fingerprint)
+
+
+def touch_cache_stamp(folder_path, fingerprint):
+    """ Mark a folder as used now, stamping it with the fingerprint if it has no stamp yet. """
+
+    stamp_path = os.path.join(folder_path, CACHE_STAMP_FILE_NAME)
+    if os.path.exists(stamp_path):
+        os.utime(stamp_path)
+    else:
+        write_cache_stamp(folder_path, fingerprint)
+
+
+def read_cache_stamp(folder_path):
+    stamp_path = os.path.join(folder_path, CACHE_STAMP_FILE_NAME)
+    if not os.path.exists(stamp_path):
+        return None
+    with open(stamp_path) as stamp_file:
+        return stamp_file.read().strip()
+
+
+def get_last_use_time(folder_path):
+    stamp_path = os.path.join(folder_path, CACHE_STAMP_FILE_NAME)
+    if os.path.exists(stamp_path):
+        return os.path.getmtime(stamp_path)
+    return os.path.getmtime(folder_path)
+
+
+def get_disk_usage_of_file(file_path):
+    stat_result = os.lstat(file_path)
+    # Prefer allocated blocks (when available) over the apparent size
+    return getattr(stat_result, 'st_blocks', 0) * 512 or stat_result.st_size
+
+
+def get_disk_usage(path, patterns=None):
+    """ Return the disk usage in bytes of a folder (optionally only for files matching patterns). """
+
+    total_size = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            if patterns and not any(fnmatch.fnmatch(file_name, p) for p in patterns):
+                continue
+            try:
+                total_size += get_disk_usage_of_file(os.path.join(dir_path, file_name))
+            except OSError:
+                continue
+    return total_size
+
+
+def remove_intermediate_objects(path):
+    """ Delete intermediate objects of a folder and return the number of bytes freed. """
+
+    freed_size = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            if not any(fnmatch.fnmatch(file_name, p) for p in INTERMEDIATE_OBJECT_PATTERNS):
+                continue
+            file_path = os.path.join(dir_path, file_name)
+            freed_size += get_disk_usage_of_file(file_path)
+            os.remove(file_path)
+    return freed_size
+
+
+def is_skipped_folder(folder_name):
+    """ Return whether project discovery should not descend into a folder (build products, hidden folders). """
+
+    return folder_name.startswith(('build-', 'sysroot-', '.')) or folder_name == 'releases'
+
+
+def discover_projects(root_dir):
+    """ Return the paths of the config.pdt files found under a root folder. """
+
+    pdt_paths = []
+    for dir_path, dir_names, file_names in os.walk(root_dir):
+        # Do not descend into build products
+        dir_names[:] = [d for d in dir_names if not is_skipped_folder(d)]
+        if 'config.pdt' in file_names:
+            pdt_paths.append(os.path.join(dir_path, 'config.pdt'))
+    return sorted(pdt_paths)
+
+
+def collect_cache_entries(root_dir):
+    entries = []
+    for pdt_path in discover_projects(root_dir):
+        pdt_dir = os.path.dirname(pdt_path)
+        for folder_name in sorted(os.listdir(pdt_dir)):
+            folder_path = os.path.join(pdt_dir, folder_name)
+            if not os.path.isdir(folder_path):
+                continue
+            for kind in ('sysroot', 'build'):
+                if folder_name.startswith(kind + '-'):
+                    target = folder_name[len(kind) + 1:]
+                    entries.append(CacheEntry(pdt_path, folder_path, kind, target))
+    return entries
+
+
+def evict(entries, quota, dry_run=False):
+    """ Free disk space in least-recently-used order until the total usage fits in the quota. """
+
+    total_size = sum(entry.size for entry in entries)
+    lru_entries = sorted(entries, key=lambda entry: entry.last_used)
+
+    # Unreferenced folders are no longer needed by any current project input
+    for entry in lru_entries:
+        if total_size <= quota:
+            break
+        if entry.referenced:
+            continue
+        if not dry_run:
+            # Never delete a folder in use by a running build
+            try:
+                with blk.lock_folder(entry.path, blk.EXCLUSIVE, blocking=False):
+                    shutil.rmtree(entry.path)
+            except blk.LockUnavailable:
+                print(f"[INFO] Skipping {entry.path}: in use by a running build")
+                continue
+        print(f"[INFO] Evicted unreferenced {entry.kind} folder {entry.path} ({format_size(entry.size)})")
+        total_size -= entry.size
+
+    # Intermediate objects of referenced folders can be regenerated by the next build
+    for entry in lru_entries:
+        if total_size <= quota:
+            break
+        if not entry.referenced:
+            continue
+        if dry_run:
+            freed_size = get_disk_usage(entry.path, INTERMEDIATE_OBJECT_PATTERNS)
+        else:
+            try:
+                with blk.lock_folder(entry.path, blk.EXCLUSIVE, blocking=False):
+                    freed_size = remove_intermediate_objects(entry.path)
+            except blk.LockUnavailable:
+                print(f"[INFO] Skipping {entry.path}: in use by a running build")
+                continue
+        if freed_size:
+            print(f"[INFO] Evicted intermediate objects of {entry.path} ({format_size(freed_size)})")
+        total_size -= freed_size
+
+    if total_size > quota:
+        print(f"[WARN] Disk usage {format_size(total_size)} still exceeds the quota of {format_size(quota)}: "
+                "the remaining folders are referenced by current project inputs")
+    return total_size
+
+
+def parse_size(size_str):
+    """ Convert a size such as 500M or 20G into bytes. """
+
+    size_str = size_str.strip().upper().rstrip('B')
+    unit = size_str[-1] if size_str and size_str[-1] in SIZE_UNITS else ''
+    number = size_str[:-1] if unit else size_str
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+def format_size(size):
+    for unit in ('', 'K', 'M', 'G'):
+        if size < 1024:
+            return f"{size:.1f}{unit}B"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def print_report(entries):
+    print("[INFO] Disk usage of build folders:")
+    for entry in sorted(entries, key=lambda entry: entry.size, reverse=True):
+        last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.last_used))
+        status = "referenced" if entry.referenced else "unreferenced"
+        print(f"    {format_size(entry.size):>10}  {last_used}  {status:<12}  {entry.path}")
+    print(f"[INFO] Total disk usage: {format_size(sum(entry.size for entry in entries))}")
+
+
+if __name__ == "__main__":
+    # Parse the command line.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--root',
+            help="the folder under which config.pdt projects are searched [default: $PYQT_CROM_DIR]",
+            metavar="DIR",
+            default=os.environ.get('PYQT_CROM_DIR', os.getcwd()))
+    parser.add_argument('--quota',
+            help="the maximum disk usage of build folders (e.g. 500M, 20G); evict when exceeded",
+            metavar="SIZE")
+    parser.add_argument('--dry-run',
+            help="only state what would be evicted",
+            action='store_true')
+    cmd_line_args = parser.parse_args()
+
+    root_dir = os.path.abspath(cmd_line_args.root)
+    if not os.path.isdir(root_dir):
+        print(f"[ERROR] Root folder {root_dir} does not exist.", file=sys.stderr)
+        sys.exit(2)
+
+    entries = collect_cache_entries(root_dir)
+    print_report(entries)
+
+    if cmd_line_args.quota:
+        try:
+            quota = parse_size(cmd_line_args.quota)
+        except (ValueError, IndexError):
+            print(f"[ERROR] Invalid quota {cmd_line_args.quota}", file=sys.stderr)
+            sys.exit(2)
+        remaining_size = evict(entries, quota, cmd_line_args.dry_run)
+        print(f"[INFO] Disk usage after eviction: {format_size(remaining_size)}")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2023-2024 Achille MARTIN
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# ---- INTRODUCTION ----
+# File-based locks protecting the sysroot-<target> and build-<target> folders
+#
+# A lock file is created next to the protected folder (so that the folder
+# itself can be deleted while locked) and locked with:
+# * a shared lock: many builds can read a finished folder at the same time
+# * an exclusive lock: a single build writes into (or deletes) the folder
+# Builds waiting for a lock are queued (polling) instead of failing.
+# Locks are released automatically if the process holding them dies.
+
+import os
+import sys
+import time
+
+if sys.platform == 'win32':
+    import msvcrt
+else:
+    import fcntl
+
+SHARED = 'shared'
+EXCLUSIVE = 'exclusive'
+LOCK_FILE_SUFFIX = '.lock'
+WAIT_MESSAGE_INTERVAL = 30
+
+
+class LockUnavailable(Exception):
+    pass
+
+
+class FolderLock():
+    def __init__(self, folder_path):
+        self.folder_path = os.path.abspath(folder_path)
+        self.lock_path = self.folder_path + LOCK_FILE_SUFFIX
+        self.lock_file = None
+        self.mode = None
+
+    def __del__(self):
+        self.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def acquire(self, mode, blocking=True):
+        """ Acquire (or convert to) a shared or exclusive lock, waiting in the queue if blocking. """
+
+        if mode not in (SHARED, EXCLUSIVE):
+            raise ValueError(f"Unknown lock mode {mode}")
+        if self.mode == mode:
+            return self
+        if self.lock_file is None:
+            self.lock_file = open(self.lock_path, 'a+')
+        elif self.mode is not None:
+            # Release before converting, so that two builds converting at once cannot deadlock
+            self._unlock()
+            self.mode = None
+
+        start_time = time.monotonic()
+        last_message_time = start_time
+        while True:
+            try:
+                self._lock(mode)
+                break
+            except OSError:
+                if not blocking:
+                    self.release()
+                    raise LockUnavailable(f"{self.folder_path} is locked by another build")
+            # Poll instead of blocking in the OS to keep informing the user
+            now = time.monotonic()
+            if now - last_message_time >= WAIT_MESSAGE_INTERVAL or last_message_time == start_time:
+                print(f"[INFO] Waiting for {mode} lock on {self.folder_path} "
+                        f"(waited {int(now - start_time)}s)")
+                last_message_time = now
+            time.sleep(0.5)
+
+        self.mode = mode
+        return self
+
+    def release(self):
+        if self.lock_file is None:
+            return
+        try:
+            self._unlock()
+        finally:
+            self.lock_file.close()
+            self.lock_file = None
+            self.mode = None
+
+    def _lock(self, mode):
+        if sys.platform == 'win32':
+            # Windows byte-range locks are exclusive only
+            self.lock_file.seek(0)
+            msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            operation = fcntl.LOCK_SH if mode == SHARED else fcntl.LOCK_EX
+            fcntl.flock(self.lock_file.fileno(), operation | fcntl.LOCK_NB)
+
+    def _unlock(self):
+        if sys.platform == 'win32':
+            self.lock_file.seek(0)
+            try:
+                msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            except OSError:
+                pass
+        else:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def lock_folder(folder_path, mode, blocking=True):
+    """ Return a lock on a folder, held until released (or the lock object deleted). """
+
+    return FolderLock(folder_path).acquire(mode, blocking)
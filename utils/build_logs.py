@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2023-2024 Achille MARTIN
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# ---- INTRODUCTION ----
+# Streaming, indexed build logs
+#
+# The output (stdout and stderr, in order) of each build stage is streamed
+# into a compressed <stage>.log.gz file, next to a small <stage>.index.json.
+# The log is written as a series of gzip members (one every CHECKPOINT_LINES
+# lines) whose compressed offsets are indexed, so that any line can be reached
+# by decompressing a single member instead of the whole log.
+# The index also records the line numbers of errors and warnings.
+#
+# Usage example to show the first error of the latest build:
+# python3 build_logs.py --pdt <path_to_config.pdt> --target linux-64
+
+import argparse
+import bisect
+import gzip
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+LOG_FILE_SUFFIX = '.log.gz'
+INDEX_FILE_SUFFIX = '.index.json'
+CHECKPOINT_LINES = 10000
+MAX_INDEXED_ENTRIES = 1000
+ERROR_PATTERN = re.compile(
+        r'\berror\s*:|\bError \d+\b|^Traceback|\bfatal\b|make(\[\d+\])?: \*\*\*|\bFAILED\b',
+        re.IGNORECASE)
+WARNING_PATTERN = re.compile(r'\bwarning\s*:', re.IGNORECASE)
+# Compiler invocations echoed by make (used to estimate the progress of a stage)
+COMPILER_PATTERN = re.compile(
+        r'^\s*(\S*/)?(\S+-)?(gcc|g\+\+|cc|c\+\+|clang|clang\+\+|cl|cl\.exe)\s.*\s[-/]c\s')
+
+
+class StageLogWriter():
+    def __init__(self, log_dir, stage_name, command):
+        os.makedirs(log_dir, exist_ok=True)
+        self.log_path = os.path.join(log_dir, stage_name + LOG_FILE_SUFFIX)
+        self.index_path = os.path.join(log_dir, stage_name + INDEX_FILE_SUFFIX)
+        self.index = {
+            'stage': stage_name,
+            'command': command,
+            'exit_code': None,
+            'start_time': time.time(),
+            'duration': None,
+            'line_count': 0,
+            'compiler_invocations': 0,
+            'error_count': 0,
+            'warning_count': 0,
+            'errors': [],
+            'warnings': [],
+            'checkpoints': [],
+        }
+        self.raw_file = open(self.log_path, 'wb')
+        self.member = None
+
+    def write_line(self, line):
+        """ Append a line (bytes, including its line ending) to the log and index it. """
+
+        line_number = self.index['line_count'] + 1
+        if self.member is None or (line_number - 1) % CHECKPOINT_LINES == 0:
+            self._start_member(line_number)
+        self.member.write(line)
+        self.index['line_count'] = line_number
+
+        text = line.decode('utf-8', errors='replace')
+        if COMPILER_PATTERN.search(text):
+            self.index['compiler_invocations'] += 1
+        if ERROR_PATTERN.search(text):
+            self._index_entry('error', line_number)
+        elif WARNING_PATTERN.search(text):
+            self._index_entry('warning', line_number)
+
+    def close(self, exit_code):
+        if self.member is not None:
+            self.member.close()
+            self.member = None
+        self.raw_file.close()
+        self.index['exit_code'] = exit_code
+        self.index['duration'] = time.time() - self.index['start_time']
+        with open(self.index_path, 'w') as index_file:
+            json.dump(self.index, index_file, indent=4)
+
+    def _start_member(self, line_number):
+        if self.member is not None:
+            self.member.close()
+        self.index['checkpoints'].append([line_number, self.raw_file.tell()])
+        self.member = gzip.GzipFile(fileobj=self.raw_file, mode='wb')
+
+    def _index_entry(self, kind, line_number):
+        self.index[kind + '_count'] += 1
+        # Keep the index small, the counts remain exact
+        if len(self.index[kind + 's']) < MAX_INDEXED_ENTRIES:
+            self.index[kind + 's'].append(line_number)
+
+
+def run_logged(args, stage_name, log_dir, echo=True, progress=None):
+    """ Run a command, stream its output into the stage log (and the terminal) and return its exit code. """
+
+    command = ' '.join(args)
+    log_writer = StageLogWriter(log_dir, stage_name, command)
+    ec = 1
+    if progress is not None:
+        progress.start()
+    try:
+        process = subprocess.Popen(command, shell=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT)
+        for line in iter(process.stdout.readline, b''):
+            log_writer.write_line(line)
+            if echo:
+                sys.stdout.buffer.write(line)
+                sys.stdout.buffer.flush()
+            if progress is not None:
+                progress.update(log_writer.index['compiler_invocations'])
+        process.stdout.close()
+        ec = process.wait()
+    finally:
+        log_writer.close(ec)
+        if progress is not None:
+            progress.finish(ec, log_writer.index['compiler_invocations'])
+    return ec
+
+
+def load_index(log_dir, stage_name):
+    with open(os.path.join(log_dir, stage_name + INDEX_FILE_SUFFIX)) as index_file:
+        return json.load(index_file)
+
+
+def list_stages(log_dir):
+    """ Return the stage names of a log folder in execution order. """
+
+    index_names = [name for name in os.listdir(log_dir) if name.endswith(INDEX_FILE_SUFFIX)]
+    return sorted(name[:-len(INDEX_FILE_SUFFIX)] for name in index_names)
+
+
+def read_lines(log_dir, stage_name, first_line, last_line, index=None):
+    """ Return the (line number, text) pairs of a line range, using the checkpoints to skip ahead. """
+
+    index = index or load_index(log_dir, stage_name)
+    if not index['checkpoints']:
+        return []
+    checkpoint_lines = [checkpoint[0] for checkpoint in index['checkpoints']]
+    checkpoint_position = max(bisect.bisect_right(checkpoint_lines, first_line) - 1, 0)
+    line_number, offset = index['checkpoints'][checkpoint_position]
+
+    lines = []
+    with open(os.path.join(log_dir, stage_name + LOG_FILE_SUFFIX), 'rb') as raw_file:
+        raw_file.seek(offset)
+        # Reading continues over the following gzip members if needed
+        with gzip.GzipFile(fileobj=raw_file, mode='rb') as log_file:
+            for line in log_file:
+                if line_number > last_line:
+                    break
+                if line_number >= first_line:
+                    lines.append((line_number, line.decode('utf-8', errors='replace').rstrip('\n')))
+                line_number += 1
+    return lines
+
+
+def find_first_error(log_dir, stage_name=None):
+    """ Return the (stage name, line number) of the first indexed error, or None.
+
+    The errors of the given stage (or else of the failed stages) are reported first, as the
+    successful stages may log benign error lines (e.g. configure checks).
+    """
+
+    stage_names = list_stages(log_dir)
+    indexes = {name: load_index(log_dir, name) for name in stage_names}
+    if stage_name is not None:
+        candidate_names = [stage_name] if stage_name in indexes else []
+    else:
+        candidate_names = [name for name in stage_names if indexes[name]['exit_code']]
+    for name in candidate_names + stage_names:
+        if indexes[name]['errors']:
+            return name, indexes[name]['errors'][0]
+    return None
+
+
+def find_latest_log_dir(pdt_path, target):
+    logs_dir = os.path.join(os.path.dirname(os.path.abspath(pdt_path)), 'logs-' + target)
+    if not os.path.isdir(logs_dir):
+        return None
+    run_names = sorted(os.listdir(logs_dir))
+    return os.path.join(logs_dir, run_names[-1]) if run_names else None
+
+
+if __name__ == "__main__":
+    # Parse the command line.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--log-dir',
+            help="the build log folder to inspect",
+            metavar="DIR")
+    parser.add_argument('--pdt',
+            help="the .pdt file of the build to inspect (the latest build logs are used)",
+            metavar="FILE")
+    parser.add_argument('--target', help="the target architecture of the build to inspect", default='')
+    parser.add_argument('--stage', help="the stage to inspect [default: the stage of the first error]")
+    parser.add_argument('--line',
+            help="the line to show [default: the first error of the stage]",
+            metavar="NUMBER", type=int)
+    parser.add_argument('--context',
+            help="the number of lines shown around the line [default: 10]",
+            metavar="NUMBER", type=int, default=10)
+    parser.add_argument('--summary', help="only summarise the stages", action='store_true')
+    cmd_line_args = parser.parse_args()
+
+    log_dir = cmd_line_args.log_dir
+    if not log_dir:
+        if not cmd_line_args.pdt or not cmd_line_args.target:
+            print("[ERROR] Either --log-dir or both --pdt and --target must be specified", file=sys.stderr)
+            sys.exit(2)
+        log_dir = find_latest_log_dir(cmd_line_args.pdt, cmd_line_args.target)
+    if not log_dir or not os.path.isdir(log_dir):
+        print("[ERROR] No build logs found", file=sys.stderr)
+        sys.exit(1)
+    print(f"[INFO] Build logs: {os.path.abspath(log_dir)}")
+
+    if cmd_line_args.summary:
+        for stage_name in list_stages(log_dir):
+            index = load_index(log_dir, stage_name)
+            print(f"    {stage_name}: exit code {index['exit_code']}, {index['line_count']} lines, "
+                    f"{index['error_count']} errors, {index['warning_count']} warnings")
+        sys.exit(0)
+
+    stage_name = cmd_line_args.stage
+    line_number = cmd_line_args.line
+    if stage_name is None:
+        first_error = find_first_error(log_dir)
+        if first_error is None:
+            print("[INFO] No error found in the build logs")
+            sys.exit(0)
+        stage_name, line_number = first_error
+    elif line_number is None:
+        errors = load_index(log_dir, stage_name)['errors']
+        if not errors:
+            print(f"[INFO] No error found in stage {stage_name}")
+            sys.exit(0)
+        line_number = errors[0]
+
+    print(f"[INFO] Stage {stage_name}, line {line_number}:\n")
+    for number, text in read_lines(log_dir, stage_name,
+            max(line_number - cmd_line_args.context, 1),
+            line_number + cmd_line_args.context):
+        marker = '>' if number == line_number else ' '
+        print(f"{marker}{number:>9}  {text}")
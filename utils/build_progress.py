@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2023-2024 Achille MARTIN
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# ---- INTRODUCTION ----
+# Progress and ETA estimation of build stages
+#
+# Estimates rely on the indexes of the successful earlier builds stored in
+# logs-<target> (see build_logs.py):
+# * the number of compiler invocations counted in the streamed output, when
+#   the earlier builds of the stage invoked the compiler
+# * the stage duration otherwise
+# Progress events are appended as JSON lines to progress.jsonl in the build
+# log folder (and to any extra file, such as one read by a build scheduler):
+# {"event": "stage_start" | "progress" | "stage_end", "stage": ..., "time": ...,
+#  "elapsed": ..., "fraction": ..., "stage_eta": ..., "build_eta": ..., ...}
+# Fraction and ETAs (in seconds) are null when there is no history to rely on.
+# Progress events are also sent while a stage prints nothing (e.g. a quiet
+# pyqtdeploy-sysroot), at most every EVENT_INTERVAL seconds.
+
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import build_logs as blogs
+
+PROGRESS_EVENTS_FILE_NAME = 'progress.jsonl'
+HISTORY_DEPTH = 5
+EVENT_INTERVAL = 1.0
+DISPLAY_INTERVAL = 10.0
+
+
+def load_stage_history(logs_root_dir, current_log_dir):
+    """ Return a dict mapping each stage name to its expected duration and compiler invocations. """
+
+    stage_samples = {}
+    if os.path.isdir(logs_root_dir):
+        run_names = sorted(os.listdir(logs_root_dir), reverse=True)
+        for run_name in run_names:
+            run_dir = os.path.join(logs_root_dir, run_name)
+            if os.path.abspath(run_dir) == os.path.abspath(current_log_dir) or not os.path.isdir(run_dir):
+                continue
+            for stage_name in blogs.list_stages(run_dir):
+                try:
+                    index = blogs.load_index(run_dir, stage_name)
+                except (OSError, ValueError):
+                    continue
+                # Failed stages stopped early: they would bias the estimates
+                if index.get('exit_code') != 0 or index.get('duration') is None:
+                    continue
+                samples = stage_samples.setdefault(stage_name, [])
+                if len(samples) < HISTORY_DEPTH:
+                    samples.append(index)
+
+    history = {}
+    for stage_name, samples in stage_samples.items():
+        history[stage_name] = {
+            'duration': statistics.median(sample['duration'] for sample in samples),
+            'compiler_invocations': statistics.median(
+                    sample.get('compiler_invocations', 0) for sample in samples),
+        }
+    return history
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "unknown"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class StageProgress():
+    def __init__(self, stage_name, history, events_paths, display=True):
+        self.stage_name = stage_name
+        self.expected = history.get(stage_name)
+        # Expected duration of the stages which usually run after this one
+        self.remaining_stages_duration = sum(stage['duration']
+                for name, stage in history.items() if name > stage_name)
+        self.events_paths = events_paths
+        self.display = display
+        self.start_time = None
+        self.last_event_time = 0.0
+        self.last_display_time = 0.0
+        self.compiler_invocations = 0
+        # The events are sent by the output reader and by the heartbeat thread
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.heartbeat_thread = None
+
+    def start(self):
+        self.start_time = time.time()
+        self.last_display_time = self.start_time
+        self.emit('stage_start', 0)
+        self.heartbeat_thread = threading.Thread(target=self.run_heartbeat, daemon=True)
+        self.heartbeat_thread.start()
+
+    def run_heartbeat(self):
+        # Keep the progress (elapsed time and ETA) up to date while the stage prints nothing
+        while not self.stop_event.wait(EVENT_INTERVAL):
+            self.update(self.compiler_invocations)
+
+    def update(self, compiler_invocations):
+        # Throttle the events, since the output can be thousands of lines per second
+        with self.lock:
+            self.compiler_invocations = compiler_invocations
+            now = time.time()
+            if now - self.last_event_time < EVENT_INTERVAL:
+                return
+            self.emit('progress', compiler_invocations)
+
+    def finish(self, exit_code, compiler_invocations):
+        self.stop_event.set()
+        if self.heartbeat_thread is not None:
+            self.heartbeat_thread.join()
+        with self.lock:
+            self.emit('stage_end', compiler_invocations, exit_code=exit_code)
+
+    def estimate(self, compiler_invocations, elapsed):
+        """ Return the (fraction done, stage ETA in seconds) of the stage, or Nones if unknown. """
+
+        if not self.expected:
+            return None, None
+        expected_invocations = self.expected['compiler_invocations']
+        if expected_invocations and compiler_invocations:
+            fraction = min(compiler_invocations / expected_invocations, 0.99)
+            return fraction, elapsed * (1 - fraction) / fraction
+        expected_duration = self.expected['duration']
+        if expected_duration:
+            fraction = min(elapsed / expected_duration, 0.99)
+            return fraction, max(expected_duration - elapsed, 0.0)
+        return None, None
+
+    def emit(self, event_name, compiler_invocations, exit_code=None):
+        now = time.time()
+        elapsed = now - self.start_time
+        if event_name == 'stage_end':
+            fraction, stage_eta = (1.0, 0.0) if exit_code == 0 else (None, None)
+        else:
+            fraction, stage_eta = self.estimate(compiler_invocations, elapsed)
+        event = {
+            'event': event_name,
+            'stage': self.stage_name,
+            'time': now,
+            'elapsed': elapsed,
+            'compiler_invocations': compiler_invocations,
+            'fraction': fraction,
+            'stage_eta': stage_eta,
+            'build_eta': None if stage_eta is None else stage_eta + self.remaining_stages_duration,
+        }
+        if exit_code is not None:
+            event['exit_code'] = exit_code
+        for events_path in self.events_paths:
+            with open(events_path, 'a') as events_file:
+                events_file.write(json.dumps(event) + '\n')
+        self.last_event_time = now
+
+        if self.display and event_name == 'progress' and now - self.last_display_time >= DISPLAY_INTERVAL:
+            percentage = "unknown" if fraction is None else f"{100 * fraction:.0f}%"
+            print(f"[PROGRESS] Stage {self.stage_name}: {percentage} done, "
+                    f"elapsed {format_duration(elapsed)}, ETA {format_duration(stage_eta)} "
+                    f"(build ETA {format_duration(event['build_eta'])})", file=sys.stderr, flush=True)
+            self.last_display_time = now
+
+
+def create_stage_progress(stage_name, log_dir, extra_events_path=None, display=True):
+    """ Create the progress estimator of a stage from the earlier builds logged next to log_dir. """
+
+    history = load_stage_history(os.path.dirname(os.path.abspath(log_dir)), log_dir)
+    os.makedirs(log_dir, exist_ok=True)
+    events_paths = [os.path.join(log_dir, PROGRESS_EVENTS_FILE_NAME)]
+    if extra_events_path:
+        events_paths.append(extra_events_path)
+    return StageProgress(stage_name, history, events_paths, display)
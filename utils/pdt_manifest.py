@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2023-2024 Achille MARTIN
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# ---- INTRODUCTION ----
+# Generation of the [[Application.Package.Content]] entries of a pdt file
+#
+# The application package folder is scanned (applying the pdt exclude globs)
+# and the Content entries of the pdt are rewritten in place, the rest of the
+# pdt being left untouched. Entries which were explicitly not included are
+# kept not included.
+# The listing of each folder is cached next to the pdt with the folder
+# modification time: only the folders whose modification time changed since
+# the last update are listed again.
+#
+# Usage example:
+# python3 pdt_manifest.py --pdt $PYQT_CROM_DIR/examples/demo/demo_project/config.pdt
+
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import pdt_parser as pdtp
+
+CONTENT_TABLE_NAME = 'Application.Package.Content'
+PACKAGE_TABLE_NAME = 'Application.Package'
+LISTING_CACHE_FORMAT_VERSION = 2
+
+
+def get_listing_cache_path(pdt_path):
+    pdt_dir, pdt_name = os.path.split(os.path.abspath(pdt_path))
+    return os.path.join(pdt_dir, '.' + pdt_name + '.manifest_cache.json')
+
+
+def load_listing_cache(cache_path):
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path) as cache_file:
+            cache_data = json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+    # Older caches stored listings already filtered by the exclude globs
+    if cache_data.get('version') != LISTING_CACHE_FORMAT_VERSION:
+        return {}
+    return cache_data['folders']
+
+
+def list_folder(folder_path, relative_path, exclude, listing_cache, new_listing_cache):
+    """ Return the (files, folders) names of a folder, listing it only if it changed. """
+
+    # The cached listing is not filtered, so that it stays valid when the exclude globs change
+    folder_mtime = os.stat(folder_path).st_mtime_ns
+    cached_listing = listing_cache.get(relative_path)
+    if cached_listing and cached_listing['mtime'] == folder_mtime:
+        file_names, folder_names = cached_listing['files'], cached_listing['folders']
+    else:
+        file_names, folder_names = [], []
+        with os.scandir(folder_path) as folder_entries:
+            for folder_entry in folder_entries:
+                if folder_entry.is_dir():
+                    folder_names.append(folder_entry.name)
+                else:
+                    file_names.append(folder_entry.name)
+        file_names.sort()
+        folder_names.sort()
+    new_listing_cache[relative_path] = {'mtime': folder_mtime, 'files': file_names, 'folders': folder_names}
+
+    def is_excluded(name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in exclude)
+
+    return ([name for name in file_names if not is_excluded(name)],
+            [name for name in folder_names if not is_excluded(name)])
+
+
+def scan_package(package_path, exclude, listing_cache, new_listing_cache, relative_path='',
+        previous_entries=()):
+    """ Return the PdtContentEntry tuple of a package folder. """
+
+    previous_entries_by_name = {entry.name: entry for entry in previous_entries}
+    file_names, folder_names = list_folder(os.path.join(package_path, relative_path), relative_path,
+            exclude, listing_cache, new_listing_cache)
+
+    entries = []
+    for name in sorted(file_names + folder_names):
+        previous_entry = previous_entries_by_name.get(name)
+        is_directory = name in folder_names
+        contents = ()
+        if is_directory:
+            contents = scan_package(package_path, exclude, listing_cache, new_listing_cache,
+                    os.path.join(relative_path, name),
+                    previous_entry.contents if previous_entry else ())
+        entries.append(pdtp.PdtContentEntry(
+                name=name,
+                included=previous_entry.included if previous_entry else True,
+                is_directory=is_directory,
+                contents=contents))
+    return tuple(entries)
+
+
+def format_content_entries(entries, table_name=CONTENT_TABLE_NAME):
+    """ Return the pdt lines of Content entries (nested entries follow their folder). """
+
+    lines = []
+    for entry in entries:
+        lines.append(f"[[{table_name}]]")
+        lines.append(f"name = {json.dumps(entry.name, ensure_ascii=False)}")
+        lines.append(f"included = {'true' if entry.included else 'false'}")
+        lines.append(f"is_directory = {'true' if entry.is_directory else 'false'}")
+        lines.append("")
+        lines.extend(format_content_entries(entry.contents, table_name + '.Content'))
+    return lines
+
+
+def get_table_name(line):
+    stripped_line = line.strip()
+    if stripped_line.startswith('[') and stripped_line.endswith(']'):
+        return stripped_line.strip('[]').strip()
+    return None
+
+
+def replace_content_section(pdt_lines, content_lines):
+    """ Return the pdt lines with the Content tables replaced by content_lines. """
+
+    table_names = [(line_index, get_table_name(line)) for line_index, line in enumerate(pdt_lines)]
+    table_names = [(line_index, name) for line_index, name in table_names if name is not None]
+    content_indexes = [line_index for line_index, name in table_names if name.startswith(CONTENT_TABLE_NAME)]
+    if content_indexes:
+        start_index = content_indexes[0]
+    else:
+        # Without Content tables yet, add them at the end of the package table
+        package_indexes = [line_index for line_index, name in table_names if name == PACKAGE_TABLE_NAME]
+        if not package_indexes:
+            raise Exception(f"No [{PACKAGE_TABLE_NAME}] table in pdt")
+        start_index = package_indexes[0] + 1
+    end_index = next((line_index for line_index, name in table_names
+            if line_index >= start_index and not name.startswith(CONTENT_TABLE_NAME)), len(pdt_lines))
+    if not content_indexes:
+        start_index = end_index
+
+    new_content_lines = [line + '\n' for line in content_lines]
+    if end_index == len(pdt_lines) and new_content_lines:
+        # pyqtdeploy does not leave an empty line at the end of the file
+        new_content_lines.pop()
+        new_content_lines[-1] = new_content_lines[-1].rstrip('\n')
+    return pdt_lines[:start_index] + new_content_lines + pdt_lines[end_index:]
+
+
+def update_package_contents(pdt_path, dry_run=False):
+    """ Update the Content entries of a pdt from its package folder and return whether they changed. """
+
+    pdt_model = pdtp.load_pdt(pdt_path)
+    package = pdt_model.application.package
+    package_path = os.path.join(os.path.dirname(pdt_model.path), package.name)
+    if not package.name or not os.path.isdir(package_path):
+        raise Exception(f"Application package path {package_path} does not exist")
+
+    cache_path = get_listing_cache_path(pdt_path)
+    listing_cache = load_listing_cache(cache_path)
+    new_listing_cache = {}
+    contents = scan_package(package_path, package.exclude, listing_cache, new_listing_cache,
+            previous_entries=package.contents)
+    changed = (contents != package.contents)
+
+    if not dry_run:
+        if changed:
+            with open(pdt_path) as pdt_object:
+                pdt_lines = pdt_object.readlines()
+            pdt_lines = replace_content_section(pdt_lines, format_content_entries(contents))
+            temporary_path = pdt_path + '.tmp'
+            with open(temporary_path, 'w') as pdt_object:
+                pdt_object.writelines(pdt_lines)
+            os.replace(temporary_path, pdt_path)
+        if new_listing_cache != listing_cache:
+            with open(cache_path, 'w') as cache_file:
+                json.dump({'version': LISTING_CACHE_FORMAT_VERSION, 'folders': new_listing_cache}, cache_file)
+    return changed
+
+
+if __name__ == "__main__":
+    # Parse the command line.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pdt',
+            help="the .pdt file whose package Content entries are updated",
+            metavar="FILE",
+            required=True)
+    parser.add_argument('--check',
+            help="do not write the pdt, exit with an error if it is not up to date",
+            action='store_true')
+    cmd_line_args = parser.parse_args()
+
+    pdt_path = os.path.abspath(cmd_line_args.pdt)
+    if not os.path.exists(pdt_path):
+        print(f"[ERROR] Path to .pdt file {pdt_path} does not exist.", file=sys.stderr)
+        sys.exit(2)
+
+    try:
+        changed = update_package_contents(pdt_path, dry_run=cmd_line_args.check)
+    except Exception as e:
+        print("[ERROR] Cannot update the application package content")
+        print("Error message:\n" + str(e))
+        sys.exit(1)
+
+    if cmd_line_args.check:
+        if changed:
+            print(f"[ERROR] The package content of {pdt_path} is not up to date", file=sys.stderr)
+            sys.exit(1)
+        print(f"[INFO] The package content of {pdt_path} is up to date")
+    elif changed:
+        print(f"[INFO] Updated the package content of {pdt_path}")
+    else:
+        print(f"[INFO] The package content of {pdt_path} is already up to date")
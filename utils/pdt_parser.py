@@ -23,30 +23,131 @@
 # SOFTWARE.
 
 # ---- INTRODUCTION ----
-# Pdt file parser based on python file parsing utilities
+# Pdt file parser based on a TOML parser
+#
+# The pdt is parsed once into a typed and immutable model (PdtModel).
+# Models are cached by file path, modification time and size, so that tools
+# querying many fields (or many projects) pay a single parse per file.
 
 import os.path
 import sys
+from dataclasses import dataclass
+
+try:
+    # Python 3.11 or later
+    import tomllib as toml_parser
+except ImportError:
+    # Python 3.10 or earlier (toml is a dependency of pyqtdeploy)
+    import toml as toml_parser
+
+@dataclass(frozen=True)
+class PdtContentEntry:
+    name: str
+    included: bool
+    is_directory: bool
+    # Entries of a directory
+    contents: tuple
+
+@dataclass(frozen=True)
+class PdtPackage:
+    name: str
+    exclude: tuple
+    contents: tuple
+
+@dataclass(frozen=True)
+class PdtApplication:
+    entry_point: str
+    is_console: bool
+    is_bundle: bool
+    name: str
+    qmake_configuration: str
+    script: str
+    syspath: str
+    package: PdtPackage
+
+@dataclass(frozen=True)
+class PdtModel:
+    path: str
+    version: int
+    sysroot: str
+    sysroots_dir: str
+    parts: tuple
+    application: PdtApplication
+
+# Cache of parsed models: absolute pdt path -> (modification time, size, model)
+_pdt_model_cache = {}
+
+def _parse_content_entries(content_data):
+    return tuple(
+            PdtContentEntry(
+                name=entry.get('name', ''),
+                included=entry.get('included', True),
+                is_directory=entry.get('is_directory', False),
+                contents=_parse_content_entries(entry.get('Content', [])),
+            )
+            for entry in content_data)
+
+def parse_pdt(pdt_path):
+    """ Parse a pdt file into a PdtModel (without caching). """
+
+    with open(pdt_path) as pdt_object:
+        pdt_data = toml_parser.loads(pdt_object.read())
+    application_data = pdt_data.get('Application', {})
+    package_data = application_data.get('Package', {})
+    return PdtModel(
+            path=os.path.abspath(pdt_path),
+            version=pdt_data.get('version', 0),
+            sysroot=pdt_data.get('sysroot', ''),
+            sysroots_dir=pdt_data.get('sysroots_dir', ''),
+            parts=tuple(pdt_data.get('parts', [])),
+            application=PdtApplication(
+                entry_point=application_data.get('entry_point', ''),
+                is_console=application_data.get('is_console', False),
+                is_bundle=application_data.get('is_bundle', False),
+                name=application_data.get('name', ''),
+                qmake_configuration=application_data.get('qmake_configuration', ''),
+                script=application_data.get('script', ''),
+                syspath=application_data.get('syspath', ''),
+                package=PdtPackage(
+                    name=package_data.get('name', ''),
+                    exclude=tuple(package_data.get('exclude', [])),
+                    contents=_parse_content_entries(package_data.get('Content', [])),
+                ),
+            ),
+    )
+
+def load_pdt(pdt_path):
+    """ Return the PdtModel of a pdt file, parsing it only if it changed since the last call. """
+
+    pdt_path = os.path.abspath(pdt_path)
+    pdt_stat = os.stat(pdt_path)
+    cached_entry = _pdt_model_cache.get(pdt_path)
+    if cached_entry and cached_entry[0] == pdt_stat.st_mtime_ns and cached_entry[1] == pdt_stat.st_size:
+        return cached_entry[2]
+    pdt_model = parse_pdt(pdt_path)
+    _pdt_model_cache[pdt_path] = (pdt_stat.st_mtime_ns, pdt_stat.st_size, pdt_model)
+    return pdt_model
 
 class PdtParser():
     def __init__(self, input_pdt_path):
         self.pdt_path = input_pdt_path
-        with open(self.pdt_path) as pdt_object:
-            pdt_data = pdt_object.readlines()
-        self.pdt_data = pdt_data
+        try:
+            self.pdt_model = load_pdt(self.pdt_path)
+        except Exception as e:
+            print("[ERROR] Cannot parse pdt file " + str(self.pdt_path))
+            print("Error message:\n" + str(e))
+            sys.exit(1)
     
     def __del__(self):
         pass
 
     def get_sysroot_path(self):
         try:
-            sysroot_entries = [line for line in self.pdt_data if line.startswith('sysroot ')]
             # TODO: add sysroots_dir potential entry
-            sysroot_entry_split = sysroot_entries[0].split("\"")
-            sysroot_entry_relative_path = sysroot_entry_split[1]
+            sysroot_entry_relative_path = self.pdt_model.sysroot
             if sysroot_entry_relative_path == '':
                 raise Exception("Sysroot path not specified in pdt")
-            sysroot_path = os.path.join(os.path.dirname(os.path.abspath(self.pdt_path)), sysroot_entry_relative_path)
+            sysroot_path = os.path.join(os.path.dirname(self.pdt_model.path), sysroot_entry_relative_path)
             if not os.path.exists(sysroot_path):
                 raise Exception("Sysroot path does not exist")
             return sysroot_path
@@ -56,26 +157,15 @@ class PdtParser():
             sys.exit(1)
 
     def get_app_name(self):
-        try:
-            application_entry = [line for line in self.pdt_data if line.startswith('[Application]')]
-            application_entry_index = self.pdt_data.index(application_entry[0])
-            application_name_entry_split = self.pdt_data[application_entry_index + 4].split("\"")
-            application_name_entry = application_name_entry_split[1]
-            if application_name_entry == '':
-                print("[WARN] Application name not specified in pdt")
-                application_name_entry == None
-            app_name = application_name_entry
-            return app_name
-        except Exception as e:
-            print("[ERROR] Cannot find application name")
-            print("Error message:\n" + str(e))
-            sys.exit(1)
+        app_name = self.pdt_model.application.name
+        if app_name == '':
+            print("[WARN] Application name not specified in pdt")
+            app_name = None
+        return app_name
     
     def get_app_entry_point_script_name(self):
         try:
-            entry_point_entries = [line for line in self.pdt_data if line.startswith('entry_point ')]
-            entry_point_entry_split = entry_point_entries[0].split("\"")
-            entry_point_entry = entry_point_entry_split[1]
+            entry_point_entry = self.pdt_model.application.entry_point
             if entry_point_entry == '':
                 raise Exception("Entry point not specified in pdt")
             # Remove folder structure preceeding the script name
@@ -91,14 +181,11 @@ class PdtParser():
 
     def get_app_package_path(self):
         try:
-            application_package_entry = [line for line in self.pdt_data if line.startswith('[Application.Package]')]
-            application_package_entry_index = self.pdt_data.index(application_package_entry[0])
-            application_package_name_entry_split = self.pdt_data[application_package_entry_index + 1].split("\"")
-            application_package_name_entry = application_package_name_entry_split[1]
+            application_package_name_entry = self.pdt_model.application.package.name
             if application_package_name_entry == '':
                 raise Exception("Package path not specified in pdt")
             app_package_relative_path = application_package_name_entry
-            app_package_path = os.path.join(os.path.dirname(os.path.abspath(self.pdt_path)), app_package_relative_path)
+            app_package_path = os.path.join(os.path.dirname(self.pdt_model.path), app_package_relative_path)
             if not os.path.exists(app_package_path):
                 raise Exception("Application package path does not exist")
             return app_package_path
@@ -119,8 +206,8 @@ if __name__ == "__main__":
     demo_pdt_path = os.path.abspath(demo_pdt_path)
     print(f"Pdt path: {demo_pdt_path}")
     my_parser = PdtParser(demo_pdt_path)
-    pdt_data = my_parser.pdt_data
-    print(f"Pdt data: {pdt_data}")
+    pdt_model = my_parser.pdt_model
+    print(f"Pdt model: {pdt_model}")
     sysroot_path = my_parser.get_sysroot_path()
     print(f"Sysroot path: {sysroot_path}")
     app_name = my_parser.get_app_name()
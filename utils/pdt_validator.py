@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2023-2024 Achille MARTIN
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# ---- INTRODUCTION ----
+# Pre-build validation of a pdt project
+#
+# Runs in seconds, before any (hour-long) build stage, and reports every
+# problem found at once:
+# * the pdt and its sysroot file can be parsed and are consistent
+#   (each part is provided by the sysroot, PyQt modules are installed)
+# * the entry point callable exists (resolved by static analysis)
+# * the package files and the Content entries of the pdt match
+# * the modules imported by the package are covered by the parts
+#
+# Usage example:
+# python3 pdt_validator.py --pdt $PYQT_CROM_DIR/examples/demo/demo_project/config.pdt --target android-64
+
+import argparse
+import ast
+import os
+import sys
+import pdt_manifest as pdtm
+import pdt_parser as pdtp
+import sysroot_parser as sysp
+
+ERROR = 'ERROR'
+WARNING = 'WARN'
+
+# Python modules always embedded by pyqtdeploy (they do not need a part)
+CORE_PYTHON_MODULES = {
+    '__future__', '_abc', '_codecs', '_collections_abc', '_frozen_importlib',
+    '_frozen_importlib_external', '_imp', '_io', '_signal', '_sre', '_stat',
+    '_thread', '_warnings', '_weakref', 'abc', 'builtins', 'codecs', 'encodings',
+    'errno', 'genericpath', 'importlib', 'io', 'marshal', 'nt', 'ntpath', 'os',
+    'posix', 'posixpath', 'stat', 'sys', 'warnings', 'zipimport',
+}
+
+# PyQt modules implied by a PyQt part (pyqtdeploy adds the dependencies of a part)
+PYQT_MODULE_DEPENDENCIES = {
+    'QtGui': ['QtCore'],
+    'QtWidgets': ['QtGui'],
+    'QtSql': ['QtWidgets'],
+    'QtNetwork': ['QtCore'],
+    'QtBluetooth': ['QtCore'],
+    'QtMultimedia': ['QtGui', 'QtNetwork'],
+    'QtMultimediaWidgets': ['QtMultimedia', 'QtWidgets'],
+    'QtPrintSupport': ['QtWidgets'],
+    'QtOpenGL': ['QtWidgets'],
+    'QtSvg': ['QtWidgets'],
+    'QtXml': ['QtCore'],
+    'QtPositioning': ['QtCore'],
+    'QtSensors': ['QtCore'],
+    'QtQml': ['QtNetwork'],
+    'QtQuick': ['QtQml', 'QtGui'],
+}
+
+
+class Problem():
+    def __init__(self, severity, message, location=None):
+        self.severity = severity
+        self.message = message
+        self.location = location
+
+    def __str__(self):
+        location = f" ({self.location})" if self.location else ""
+        return f"[{self.severity}] {self.message}{location}"
+
+
+def get_installed_pyqt_modules(sysroot_data, target):
+    """ Return the PyQt modules installed for a target or platform (None if unrestricted or unknown). """
+
+    pyqt_options = sysp.resolve_component(sysroot_data.get('PyQt', {}), target)
+    if 'installed_modules' in pyqt_options:
+        return set(pyqt_options['installed_modules'])
+    return None
+
+
+def get_covered_pyqt_modules(parts):
+    covered_modules = set()
+    pending_modules = [part.split(':', 1)[1].split('.')[-1] for part in parts
+            if part.startswith('PyQt:PyQt5.')]
+    while pending_modules:
+        module = pending_modules.pop()
+        if module not in covered_modules:
+            covered_modules.add(module)
+            pending_modules.extend(PYQT_MODULE_DEPENDENCIES.get(module, []))
+    return covered_modules
+
+
+def is_covered_by_parts(module_name, parts):
+    part_modules = [part.split(':', 1)[1] for part in parts if ':' in part]
+    return any(module_name == part_module
+            or module_name.startswith(part_module + '.')
+            or part_module.startswith(module_name + '.')
+            for part_module in part_modules)
+
+
+def get_module_path(pdt_dir, module_name):
+    """ Return the source file of a module of the application package, or None. """
+
+    module_base_path = os.path.join(pdt_dir, *module_name.split('.'))
+    for candidate_path in (module_base_path + '.py', os.path.join(module_base_path, '__init__.py')):
+        if os.path.isfile(candidate_path):
+            return candidate_path
+    return None
+
+
+def parse_python_file(file_path, problems):
+    try:
+        with open(file_path, 'rb') as file_object:
+            return ast.parse(file_object.read(), filename=file_path)
+    except (SyntaxError, ValueError) as e:
+        problems.append(Problem(ERROR, f"Cannot parse Python file: {e}", file_path))
+        return None
+
+
+def get_top_level_names(tree):
+    names = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names.update(target.id for target in targets if isinstance(target, ast.Name))
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split('.')[0] for alias in node.names)
+    return names
+
+
+def get_imported_modules(tree):
+    """ Return the absolute module names imported by a module (relative imports are local). """
+
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.add(node.module)
+    return modules
+
+
+def validate_entry_point(pdt_model, problems):
+    entry_point = pdt_model.application.entry_point
+    if not entry_point:
+        problems.append(Problem(ERROR, "Entry point not specified in pdt", pdt_model.path))
+        return
+    module_name, _, callable_name = entry_point.partition(':')
+    if not callable_name:
+        problems.append(Problem(ERROR, f"Entry point {entry_point} does not specify a callable (module:callable)",
+                pdt_model.path))
+        return
+    package_name = pdt_model.application.package.name
+    if module_name.split('.')[0] != package_name:
+        problems.append(Problem(WARNING, f"Entry point module {module_name} is not part of the package {package_name}",
+                pdt_model.path))
+    module_path = get_module_path(os.path.dirname(pdt_model.path), module_name)
+    if module_path is None:
+        problems.append(Problem(ERROR, f"Entry point module {module_name} not found", pdt_model.path))
+        return
+    tree = parse_python_file(module_path, problems)
+    if tree is not None and callable_name not in get_top_level_names(tree):
+        problems.append(Problem(ERROR, f"Entry point callable {callable_name} is not defined in {module_name}",
+                module_path))
+
+
+def compare_contents(expected_entries, declared_entries, relative_path, problems, pdt_path):
+    declared_by_name = {entry.name: entry for entry in declared_entries}
+    expected_by_name = {entry.name: entry for entry in expected_entries}
+    for name, expected_entry in expected_by_name.items():
+        entry_path = os.path.join(relative_path, name)
+        declared_entry = declared_by_name.get(name)
+        if declared_entry is None:
+            problems.append(Problem(ERROR, f"Package file {entry_path} is missing from the pdt Content entries",
+                    pdt_path))
+        elif declared_entry.is_directory != expected_entry.is_directory:
+            problems.append(Problem(ERROR, f"Package entry {entry_path} is_directory does not match the package",
+                    pdt_path))
+        elif declared_entry.included and expected_entry.is_directory:
+            compare_contents(expected_entry.contents, declared_entry.contents, entry_path, problems, pdt_path)
+    for name in declared_by_name:
+        if name not in expected_by_name:
+            problems.append(Problem(ERROR,
+                    f"Pdt Content entry {os.path.join(relative_path, name)} does not exist in the package",
+                    pdt_path))
+
+
+def iterate_included_files(entries, relative_path=''):
+    for entry in entries:
+        if not entry.included:
+            continue
+        entry_path = os.path.join(relative_path, entry.name)
+        if entry.is_directory:
+            yield from iterate_included_files(entry.contents, entry_path)
+        else:
+            yield entry_path
+
+
+def validate_package(pdt_model, problems):
+    package = pdt_model.application.package
+    package_path = os.path.join(os.path.dirname(pdt_model.path), package.name)
+    if not package.name or not os.path.isdir(package_path):
+        problems.append(Problem(ERROR, f"Application package path {package_path} does not exist", pdt_model.path))
+        return None
+    expected_entries = pdtm.scan_package(package_path, package.exclude, {}, {})
+    compare_contents(expected_entries, package.contents, '', problems, pdt_model.path)
+    return package_path
+
+
+def validate_imports(pdt_model, package_path, problems):
+    parts = pdt_model.parts
+    package_name = pdt_model.application.package.name
+    covered_pyqt_modules = get_covered_pyqt_modules(parts)
+    stdlib_modules = getattr(sys, 'stdlib_module_names', set())
+    for file_path in iterate_included_files(pdt_model.application.package.contents):
+        if not file_path.endswith('.py'):
+            continue
+        absolute_file_path = os.path.join(package_path, file_path)
+        if not os.path.isfile(absolute_file_path):
+            continue
+        tree = parse_python_file(absolute_file_path, problems)
+        if tree is None:
+            continue
+        for module_name in sorted(get_imported_modules(tree)):
+            top_level_name = module_name.split('.')[0]
+            if top_level_name == package_name or top_level_name in CORE_PYTHON_MODULES:
+                continue
+            if top_level_name == 'PyQt5':
+                pyqt_module = module_name.split('.')[1] if '.' in module_name else None
+                if pyqt_module and pyqt_module not in covered_pyqt_modules and pyqt_module != 'sip':
+                    problems.append(Problem(ERROR, f"Imported module {module_name} is not covered by the pdt parts "
+                            f"(add PyQt:{module_name})", absolute_file_path))
+            elif not is_covered_by_parts(module_name, parts):
+                part_package = 'Python' if top_level_name in stdlib_modules else '<package>'
+                problems.append(Problem(ERROR, f"Imported module {module_name} is not covered by the pdt parts "
+                        f"(add {part_package}:{module_name})", absolute_file_path))
+
+
+def validate_sysroot(pdt_model, target, problems):
+    if not pdt_model.sysroot:
+        problems.append(Problem(ERROR, "Sysroot path not specified in pdt", pdt_model.path))
+        return
+    sysroot_path = os.path.join(os.path.dirname(pdt_model.path), pdt_model.sysroot)
+    if not os.path.isfile(sysroot_path):
+        problems.append(Problem(ERROR, f"Sysroot path {sysroot_path} does not exist", pdt_model.path))
+        return
+    try:
+        sysroot_data = sysp.load_sysroot(sysroot_path)
+    except Exception as e:
+        problems.append(Problem(ERROR, f"Cannot parse sysroot file: {e}", sysroot_path))
+        return
+
+    for part in pdt_model.parts:
+        part_package = part.split(':', 1)[0]
+        if part_package not in sysroot_data:
+            problems.append(Problem(ERROR, f"Part {part} is not provided by the sysroot (no [{part_package}] table)",
+                    sysroot_path))
+
+    # Check the PyQt modules for the target, or for every platform of the sysroot
+    targets = [target] if target else list(sysp.PLATFORM_NAMES)
+    for pyqt_module in sorted(get_covered_pyqt_modules(pdt_model.parts)):
+        for target_name in targets:
+            installed_modules = get_installed_pyqt_modules(sysroot_data, target_name)
+            if installed_modules is not None and pyqt_module not in installed_modules:
+                problems.append(Problem(ERROR, f"PyQt module {pyqt_module} is not in installed_modules "
+                        f"for {target_name}", sysroot_path))
+
+
+def validate_project(pdt_path, target=''):
+    """ Return the list of problems found in a pdt project. """
+
+    problems = []
+    try:
+        pdt_model = pdtp.load_pdt(pdt_path)
+    except Exception as e:
+        return [Problem(ERROR, f"Cannot parse pdt file: {e}", pdt_path)]
+
+    if not pdt_model.application.name:
+        problems.append(Problem(WARNING, "Application name not specified in pdt", pdt_model.path))
+    validate_sysroot(pdt_model, target, problems)
+    validate_entry_point(pdt_model, problems)
+    package_path = validate_package(pdt_model, problems)
+    if package_path is not None:
+        validate_imports(pdt_model, package_path, problems)
+    return problems
+
+
+def report_problems(problems):
+    """ Print the problems and return whether the project is valid (no error). """
+
+    for problem in problems:
+        print(str(problem), file=sys.stderr if problem.severity == ERROR else sys.stdout)
+    error_count = sum(1 for problem in problems if problem.severity == ERROR)
+    warning_count = len(problems) - error_count
+    print(f"[INFO] Validation found {error_count} errors and {warning_count} warnings")
+    return error_count == 0
+
+
+if __name__ == "__main__":
+    # Parse the command line.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pdt',
+            help="the .pdt file to validate",
+            metavar="FILE",
+            required=True)
+    parser.add_argument('--target', help="the target architecture [default: all sysroot platforms]", default='')
+    cmd_line_args = parser.parse_args()
+
+    pdt_path = os.path.abspath(cmd_line_args.pdt)
+    if not os.path.exists(pdt_path):
+        print(f"[ERROR] Path to .pdt file {pdt_path} does not exist.", file=sys.stderr)
+        sys.exit(2)
+
+    if not report_problems(validate_project(pdt_path, cmd_line_args.target)):
+        sys.exit(1)
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2023-2024 Achille MARTIN
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# ---- INTRODUCTION ----
+# Index of the pdt projects found under a root folder
+#
+# The config.pdt files (and their sysroot.toml) are parsed in a process pool
+# and summarised in a persistent index file. Each update only re-parses the
+# projects whose pdt or sysroot file changed (modification time or size).
+# The listing of every folder is stored with its modification time, so that
+# the discovery only re-lists the folders whose entries changed.
+#
+# Usage example to find the apps using QtSql:
+# python3 project_indexer.py --root $PYQT_CROM_DIR --module QtSql
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import build_cache as bcache
+import pdt_parser as pdtp
+
+INDEX_FILE_NAME = '.pyqt_crom_project_index.json'
+INDEX_FORMAT_VERSION = 2
+
+
+def get_file_signature(file_path):
+    """ Return the (modification time, size) of a file, or None if it does not exist. """
+
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
+        return None
+    return [file_stat.st_mtime_ns, file_stat.st_size]
+
+
+def index_project(pdt_path):
+    """ Parse a project and return its index entry (run in a worker process). """
+
+    entry = {
+        'pdt_signature': get_file_signature(pdt_path),
+        'sysroot_path': None,
+        'sysroot_signature': None,
+        'error': None,
+    }
+    try:
+        pdt_model = pdtp.parse_pdt(pdt_path)
+        application = pdt_model.application
+        entry.update({
+            'app_name': application.name,
+            'entry_point': application.entry_point,
+            'package': application.package.name,
+            'parts': list(pdt_model.parts),
+        })
+        if pdt_model.sysroot:
+            sysroot_path = os.path.normpath(os.path.join(os.path.dirname(pdt_path), pdt_model.sysroot))
+            entry['sysroot_path'] = sysroot_path
+            entry['sysroot_signature'] = get_file_signature(sysroot_path)
+            with open(sysroot_path) as sysroot_object:
+                sysroot_data = pdtp.toml_parser.loads(sysroot_object.read())
+            entry['sysroot_components'] = sorted(sysroot_data)
+            # Modules installed per platform (e.g. [PyQt.android])
+            pyqt_data = sysroot_data.get('PyQt', {})
+            installed_modules = {}
+            for key, value in pyqt_data.items():
+                if isinstance(value, dict) and 'installed_modules' in value:
+                    installed_modules[key] = sorted(value['installed_modules'])
+            if 'installed_modules' in pyqt_data:
+                installed_modules[''] = sorted(pyqt_data['installed_modules'])
+            entry['installed_modules'] = installed_modules
+    except Exception as e:
+        entry['error'] = str(e)
+    return entry
+
+
+def discover_projects(root_dir, previous_folders):
+    """ Return the config.pdt paths under root_dir and the folder listings used to find them.
+
+    A folder whose modification time did not change since the previous run is not
+    listed again: its cached sub-folders and config.pdt presence are reused.
+    A change deeper in the tree does not update the modification time of the parent
+    folders, so every folder is still visited (one stat call each).
+    """
+
+    pdt_paths = []
+    folders = {}
+    pending_dirs = [root_dir]
+    while pending_dirs:
+        dir_path = pending_dirs.pop()
+        try:
+            dir_mtime = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            continue
+        listing = previous_folders.get(dir_path)
+        if listing is None or listing['mtime'] != dir_mtime:
+            try:
+                with os.scandir(dir_path) as dir_entries:
+                    dir_entries = list(dir_entries)
+            except OSError:
+                continue
+            listing = {
+                'mtime': dir_mtime,
+                'has_pdt': any(e.name == 'config.pdt' and e.is_file() for e in dir_entries),
+                'sub_dirs': sorted(e.name for e in dir_entries
+                        if e.is_dir(follow_symlinks=False) and not bcache.is_skipped_folder(e.name)),
+            }
+        folders[dir_path] = listing
+        if listing['has_pdt']:
+            pdt_paths.append(os.path.join(dir_path, 'config.pdt'))
+        pending_dirs.extend(os.path.join(dir_path, d) for d in listing['sub_dirs'])
+    return sorted(pdt_paths), folders
+
+
+def load_index(index_path):
+    """ Return the (projects, folders) stored in the index file, empty if it is missing or outdated. """
+
+    if not os.path.exists(index_path):
+        return {}, {}
+    try:
+        with open(index_path) as index_file:
+            index_data = json.load(index_file)
+    except (OSError, ValueError):
+        return {}, {}
+    if index_data.get('version') != INDEX_FORMAT_VERSION:
+        return {}, {}
+    return index_data['projects'], index_data['folders']
+
+
+def save_index(index_path, projects, folders):
+    # Write then rename, so that readers never see a partial index
+    temporary_path = index_path + '.tmp'
+    with open(temporary_path, 'w') as index_file:
+        json.dump({'version': INDEX_FORMAT_VERSION, 'projects': projects, 'folders': folders},
+                index_file, indent=1, sort_keys=True)
+    os.replace(temporary_path, index_path)
+
+
+def is_entry_up_to_date(pdt_path, entry):
+    if entry.get('pdt_signature') != get_file_signature(pdt_path):
+        return False
+    if entry.get('sysroot_path') and entry.get('sysroot_signature') != get_file_signature(entry['sysroot_path']):
+        return False
+    return True
+
+
+def update_index(root_dir, index_path, jobs=None):
+    """ Bring the index of the projects under root_dir up to date and return its projects. """
+
+    previous_projects, previous_folders = load_index(index_path)
+    pdt_paths, folders = discover_projects(root_dir, previous_folders)
+    projects = {}
+    stale_pdt_paths = []
+    for pdt_path in pdt_paths:
+        entry = previous_projects.get(pdt_path)
+        if entry is not None and is_entry_up_to_date(pdt_path, entry):
+            projects[pdt_path] = entry
+        else:
+            stale_pdt_paths.append(pdt_path)
+
+    if stale_pdt_paths:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            for pdt_path, entry in zip(stale_pdt_paths, executor.map(index_project, stale_pdt_paths, chunksize=8)):
+                projects[pdt_path] = entry
+
+    removed_count = len(set(previous_projects) - set(projects))
+    # A folder whose only change is its modification time is just listed again on
+    # the next run (the index file itself changes the mtime of the folder holding it)
+    listings_changed = (folders.keys() != previous_folders.keys()
+            or any(listing['sub_dirs'] != previous_folders[dir_path]['sub_dirs']
+                    or listing['has_pdt'] != previous_folders[dir_path]['has_pdt']
+                    for dir_path, listing in folders.items()))
+    if stale_pdt_paths or removed_count or listings_changed:
+        save_index(index_path, projects, folders)
+    print(f"[INFO] Indexed {len(projects)} projects "
+            f"({len(stale_pdt_paths)} parsed, {removed_count} removed)", file=sys.stderr)
+    return projects
+
+
+def get_project_modules(entry):
+    """ Return the PyQt modules used by a project (from its parts and its sysroot). """
+
+    modules = set()
+    for part in entry.get('parts', []):
+        package, _, module = part.partition(':')
+        modules.add(module.split('.')[-1])
+    for platform_modules in entry.get('installed_modules', {}).values():
+        modules.update(platform_modules)
+    return modules
+
+
+def query(projects, sysroot=None, module=None, entry_point=None, part=None):
+    """ Return the pdt paths of the projects matching all the given criteria. """
+
+    sysroot = os.path.abspath(sysroot) if sysroot else None
+    matches = []
+    for pdt_path, entry in sorted(projects.items()):
+        if sysroot and entry.get('sysroot_path') != sysroot:
+            continue
+        if module and module not in get_project_modules(entry):
+            continue
+        if entry_point and entry_point not in entry.get('entry_point', ''):
+            continue
+        if part and part not in entry.get('parts', []):
+            continue
+        matches.append(pdt_path)
+    return matches
+
+
+if __name__ == "__main__":
+    # Parse the command line.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--root',
+            help="the folder under which config.pdt projects are searched [default: $PYQT_CROM_DIR]",
+            metavar="DIR",
+            default=os.environ.get('PYQT_CROM_DIR', os.getcwd()))
+    parser.add_argument('--index',
+            help=f"the index file [default: <root>/{INDEX_FILE_NAME}]",
+            metavar="FILE")
+    parser.add_argument('--jobs',
+            help="the number of parsing processes [default: number of CPUs]",
+            metavar="NUMBER", type=int)
+    parser.add_argument('--sysroot', help="only list the projects using this sysroot file", metavar="FILE")
+    parser.add_argument('--module', help="only list the projects using this PyQt module (e.g. QtSql)")
+    parser.add_argument('--entry-point', help="only list the projects whose entry point contains this text")
+    parser.add_argument('--part', help="only list the projects using this part (e.g. Python:logging)")
+    parser.add_argument('--json', help="print the matching index entries as JSON", action='store_true')
+    cmd_line_args = parser.parse_args()
+
+    root_dir = os.path.abspath(cmd_line_args.root)
+    if not os.path.isdir(root_dir):
+        print(f"[ERROR] Root folder {root_dir} does not exist.", file=sys.stderr)
+        sys.exit(2)
+    index_path = os.path.abspath(cmd_line_args.index or os.path.join(root_dir, INDEX_FILE_NAME))
+
+    projects = update_index(root_dir, index_path, cmd_line_args.jobs)
+    matches = query(projects,
+            sysroot=cmd_line_args.sysroot,
+            module=cmd_line_args.module,
+            entry_point=cmd_line_args.entry_point,
+            part=cmd_line_args.part)
+
+    if cmd_line_args.json:
+        print(json.dumps({pdt_path: projects[pdt_path] for pdt_path in matches}, indent=4))
+    else:
+        for pdt_path in matches:
+            entry = projects[pdt_path]
+            if entry['error']:
+                print(f"{pdt_path}  [ERROR] {entry['error']}")
+            else:
+                print(f"{pdt_path}  {entry['app_name']}  {entry['entry_point']}")
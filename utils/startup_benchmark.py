@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2023-2024 Achille MARTIN
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# ---- INTRODUCTION ----
+# Startup-time benchmark for linux-64 executables released by build_app.py
+#
+# The app is launched headless (QT_QPA_PLATFORM=offscreen) with the
+# PYQT_CROM_STARTUP_TRACE environment variable pointing to a trace file.
+# The app appends one "<milestone> <epoch_ms>" line per startup milestone:
+# * app_created: QApplication constructed
+# * main_window_created: main window constructed
+# * event_loop_idle: first pass of the event loop
+# Timings are measured from process launch and stored next to the executable
+# so that each release can be compared against the earlier ones.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import pdt_parser as pdtp
+
+STARTUP_TRACE_ENV_VAR = "PYQT_CROM_STARTUP_TRACE"
+STARTUP_MILESTONES = ["app_created", "main_window_created", "event_loop_idle"]
+BENCHMARK_RESULTS_FILE_NAME = "startup_benchmark.json"
+
+
+def read_startup_trace(trace_path):
+    """ Return a dict mapping each recorded milestone to its epoch time in ms. """
+
+    milestones = {}
+    if not os.path.exists(trace_path):
+        return milestones
+    with open(trace_path) as trace_file:
+        for line in trace_file:
+            line_split = line.split()
+            if len(line_split) != 2:
+                continue
+            milestone, timestamp_ms = line_split
+            # Only the first occurrence of a milestone is relevant for startup
+            milestones.setdefault(milestone, float(timestamp_ms))
+    return milestones
+
+
+def run_startup_once(executable_path, timeout):
+    """ Launch the app once and return the time (in ms) to reach each milestone. """
+
+    with tempfile.TemporaryDirectory() as trace_dir:
+        trace_path = os.path.join(trace_dir, 'startup_trace.txt')
+        env = dict(os.environ)
+        env['QT_QPA_PLATFORM'] = 'offscreen'
+        env[STARTUP_TRACE_ENV_VAR] = trace_path
+
+        launch_ms = time.time() * 1000
+        process = subprocess.Popen([executable_path],
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + timeout
+            milestones = {}
+            while time.monotonic() < deadline:
+                milestones = read_startup_trace(trace_path)
+                if STARTUP_MILESTONES[-1] in milestones or process.poll() is not None:
+                    break
+                time.sleep(0.005)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        milestones = read_startup_trace(trace_path)
+
+    missing_milestones = [m for m in STARTUP_MILESTONES if m not in milestones]
+    if missing_milestones:
+        raise Exception(f"Milestones {missing_milestones} not reached within {timeout}s. "
+                f"Make sure that the app records them when {STARTUP_TRACE_ENV_VAR} is set.")
+    return {m: milestones[m] - launch_ms for m in STARTUP_MILESTONES}
+
+
+def compute_statistics(samples):
+    """ Summarise a list of durations (in ms). """
+
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'max': max(samples),
+    }
+
+
+def run_benchmark(executable_path, runs, warmup_runs, timeout):
+    """ Launch the app several times and return the statistics per milestone. """
+
+    for _ in range(warmup_runs):
+        run_startup_once(executable_path, timeout)
+
+    samples = {m: [] for m in STARTUP_MILESTONES}
+    for run_index in range(runs):
+        timings = run_startup_once(executable_path, timeout)
+        print(f"[INFO] Run {run_index + 1}/{runs}: "
+                + ", ".join(f"{m}={timings[m]:.1f}ms" for m in STARTUP_MILESTONES))
+        for milestone in STARTUP_MILESTONES:
+            samples[milestone].append(timings[milestone])
+
+    return {
+        'executable': os.path.basename(executable_path),
+        'runs': runs,
+        'milestones': {m: compute_statistics(samples[m]) for m in STARTUP_MILESTONES},
+    }
+
+
+def load_release_results(release_dir):
+    results_path = os.path.join(release_dir, BENCHMARK_RESULTS_FILE_NAME)
+    if not os.path.exists(results_path):
+        return None
+    with open(results_path) as results_file:
+        return json.load(results_file)
+
+
+def compare_with_earlier_releases(releases_dir, release_name, results):
+    """ Print the median startup time difference against each earlier benchmarked release. """
+
+    earlier_release_names = sorted(name for name in os.listdir(releases_dir) if name < release_name)
+    compared_releases = 0
+    for earlier_release_name in reversed(earlier_release_names):
+        earlier_results = load_release_results(os.path.join(releases_dir, earlier_release_name))
+        if earlier_results is None:
+            continue
+        compared_releases += 1
+        print(f"\n[INFO] Comparison against release {earlier_release_name}:")
+        for milestone in STARTUP_MILESTONES:
+            earlier_stats = earlier_results['milestones'].get(milestone)
+            if earlier_stats is None:
+                continue
+            current_median = results['milestones'][milestone]['median']
+            earlier_median = earlier_stats['median']
+            delta = current_median - earlier_median
+            delta_percent = 100 * delta / earlier_median if earlier_median else 0.0
+            print(f"    {milestone}: {earlier_median:.1f}ms -> {current_median:.1f}ms "
+                    f"({delta:+.1f}ms, {delta_percent:+.1f}%)")
+    if not compared_releases:
+        print("\n[INFO] No earlier benchmarked release to compare against")
+
+
+if __name__ == "__main__":
+    # Parse the command line.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pdt',
+            help="the .pdt file used to build the released app",
+            metavar="FILE",
+            required=True)
+    parser.add_argument('--release',
+            help="the release (timestamp folder name) to benchmark [default: latest]",
+            default='')
+    parser.add_argument('--runs',
+            help="the number of measured launches [default: 10]",
+            metavar="NUMBER", type=int, default=10)
+    parser.add_argument('--warmup-runs',
+            help="the number of launches discarded before measuring [default: 1]",
+            metavar="NUMBER", type=int, default=1)
+    parser.add_argument('--timeout',
+            help="the maximum time in seconds for one launch to reach the event loop [default: 30]",
+            metavar="SECONDS", type=float, default=30)
+    cmd_line_args = parser.parse_args()
+
+    pdt_path = os.path.abspath(cmd_line_args.pdt)
+    if not os.path.exists(pdt_path):
+        print(f"[ERROR] Path to .pdt file {pdt_path} does not exist.", file=sys.stderr)
+        sys.exit(2)
+    if cmd_line_args.runs < 1:
+        print("[ERROR] At least one run is required.", file=sys.stderr)
+        sys.exit(2)
+
+    pdt_parser = pdtp.PdtParser(pdt_path)
+    app_entrypoint_name = pdt_parser.get_app_entry_point_script_name()
+    app_package_dir = pdt_parser.get_app_package_path()
+    releases_dir = os.path.abspath(os.path.join(app_package_dir, os.path.pardir, 'releases'))
+    if not os.path.isdir(releases_dir):
+        print(f"[ERROR] No release found in {releases_dir}. Build the app first.", file=sys.stderr)
+        sys.exit(1)
+
+    release_name = cmd_line_args.release
+    if not release_name:
+        release_names = sorted(name for name in os.listdir(releases_dir)
+                if os.path.isfile(os.path.join(releases_dir, name, app_entrypoint_name)))
+        if not release_names:
+            print(f"[ERROR] No released executable {app_entrypoint_name} found in {releases_dir}",
+                    file=sys.stderr)
+            sys.exit(1)
+        release_name = release_names[-1]
+    release_dir = os.path.join(releases_dir, release_name)
+    executable_path = os.path.join(release_dir, app_entrypoint_name)
+    if not os.access(executable_path, os.X_OK):
+        print(f"[ERROR] Released executable {executable_path} cannot be run", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"[INFO] Benchmarking startup of {executable_path} over {cmd_line_args.runs} runs")
+    try:
+        results = run_benchmark(executable_path,
+                cmd_line_args.runs,
+                cmd_line_args.warmup_runs,
+                cmd_line_args.timeout)
+    except Exception as e:
+        print("[ERROR] Startup benchmark failed")
+        print("Error message:\n" + str(e))
+        sys.exit(1)
+
+    print("\n[INFO] Startup time from launch (ms):")
+    for milestone in STARTUP_MILESTONES:
+        stats = results['milestones'][milestone]
+        print(f"    {milestone}: median={stats['median']:.1f} mean={stats['mean']:.1f} "
+                f"stdev={stats['stdev']:.1f} min={stats['min']:.1f} max={stats['max']:.1f}")
+
+    results_path = os.path.join(release_dir, BENCHMARK_RESULTS_FILE_NAME)
+    with open(results_path, 'w') as results_file:
+        json.dump(results, results_file, indent=4)
+    print(f"\n[INFO] Results saved to {results_path}")
+
+    compare_with_earlier_releases(releases_dir, release_name, results)
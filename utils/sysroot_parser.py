@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+# MIT License
+
+# Copyright (c) 2023-2024 Achille MARTIN
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# ---- INTRODUCTION ----
+# Sysroot file parser, fingerprint and diff tool
+#
+# A sysroot.toml declares components (e.g. [Python], [PyQt], [Qt]) whose
+# options can be overridden per platform or target (e.g. [PyQt.android],
+# [Qt.win], [zlib.linux|macos]). For a given target, the options of each
+# component are resolved (target scope over platform scope over defaults)
+# and fingerprinted from a canonical form: comments, formatting and the
+# options of other platforms do not change the fingerprint.
+#
+# Usage example to compare two sysroots for a target:
+# python3 sysroot_parser.py --sysroot <path_to_sysroot.toml> --compare <path_to_other_sysroot.toml> --target android-64
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import pdt_parser as pdtp
+
+# Scope names used by pyqtdeploy for the platforms
+PLATFORM_NAMES = ('android', 'ios', 'linux', 'macos', 'win')
+
+
+def load_sysroot(sysroot_path):
+    """ Return the raw content of a sysroot file. """
+
+    with open(sysroot_path) as sysroot_object:
+        return pdtp.toml_parser.loads(sysroot_object.read())
+
+
+def get_target_platform(target):
+    """ Return the platform of a target (e.g. android for android-64). """
+
+    platform = target.split('-')[0]
+    if platform not in PLATFORM_NAMES:
+        raise ValueError(f"Unknown target {target}")
+    return platform
+
+
+def is_scope(key, value):
+    if not isinstance(value, dict):
+        return False
+    return all(scope in PLATFORM_NAMES or scope.split('-')[0] in PLATFORM_NAMES for scope in key.split('|'))
+
+
+def resolve_component(component_data, target):
+    """ Return the options of a component for a target, with the platform overrides applied. """
+
+    platform = get_target_platform(target)
+    options = {key: value for key, value in component_data.items() if not is_scope(key, value)}
+    platform_options = {}
+    target_options = {}
+    for key, value in component_data.items():
+        if not is_scope(key, value):
+            continue
+        scopes = key.split('|')
+        if target in scopes:
+            target_options.update(value)
+        elif platform in scopes:
+            platform_options.update(value)
+    options.update(platform_options)
+    options.update(target_options)
+    return options
+
+
+def resolve_sysroot(sysroot_data, target):
+    """ Return a dict mapping each component of a sysroot to its options for a target. """
+
+    return {name: resolve_component(component_data, target)
+            for name, component_data in sysroot_data.items()
+            if isinstance(component_data, dict)}
+
+
+def compute_component_fingerprint(component_name, options):
+    canonical_form = json.dumps({'component': component_name, 'options': options},
+            sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical_form.encode()).hexdigest()
+
+
+def compute_fingerprints(sysroot_path, target):
+    """ Return the fingerprint of each component and of the whole sysroot for a target. """
+
+    resolved_sysroot = resolve_sysroot(load_sysroot(sysroot_path), target)
+    component_fingerprints = {name: compute_component_fingerprint(name, options)
+            for name, options in resolved_sysroot.items()}
+    hasher = hashlib.sha256(target.encode())
+    for name in sorted(component_fingerprints):
+        hasher.update(f"{name}:{component_fingerprints[name]}".encode())
+    return {'sysroot': hasher.hexdigest(), 'components': component_fingerprints}
+
+
+def diff_sysroots(sysroot_path_a, sysroot_path_b, target):
+    """ Return the structured difference between two sysroots for a target. """
+
+    resolved_a = resolve_sysroot(load_sysroot(sysroot_path_a), target)
+    resolved_b = resolve_sysroot(load_sysroot(sysroot_path_b), target)
+    diff = {
+        'target': target,
+        'identical': resolved_a == resolved_b,
+        'added_components': sorted(set(resolved_b) - set(resolved_a)),
+        'removed_components': sorted(set(resolved_a) - set(resolved_b)),
+        'changed_components': {},
+    }
+    for name in sorted(set(resolved_a) & set(resolved_b)):
+        options_a, options_b = resolved_a[name], resolved_b[name]
+        if options_a == options_b:
+            continue
+        changed_options = {}
+        for option in sorted(set(options_a) | set(options_b)):
+            if options_a.get(option) != options_b.get(option):
+                changed_options[option] = {'before': options_a.get(option), 'after': options_b.get(option)}
+        diff['changed_components'][name] = changed_options
+    return diff
+
+
+def print_diff(diff):
+    if diff['identical']:
+        print(f"[INFO] The sysroots are identical for target {diff['target']}")
+        return
+    print(f"[INFO] The sysroots differ for target {diff['target']}:")
+    for name in diff['added_components']:
+        print(f"    + [{name}]")
+    for name in diff['removed_components']:
+        print(f"    - [{name}]")
+    for name, changed_options in diff['changed_components'].items():
+        print(f"    ~ [{name}]")
+        for option, change in changed_options.items():
+            print(f"        {option}: {change['before']} -> {change['after']}")
+
+
+if __name__ == "__main__":
+    # Parse the command line.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sysroot',
+            help="the sysroot file to fingerprint",
+            metavar="FILE",
+            required=True)
+    parser.add_argument('--compare',
+            help="another sysroot file to compare with",
+            metavar="FILE")
+    parser.add_argument('--target', help="the target architecture (e.g. android-64)", required=True)
+    parser.add_argument('--json', help="print the result as JSON", action='store_true')
+    cmd_line_args = parser.parse_args()
+
+    for sysroot_path in (cmd_line_args.sysroot, cmd_line_args.compare):
+        if sysroot_path and not os.path.exists(sysroot_path):
+            print(f"[ERROR] Path to sysroot file {sysroot_path} does not exist.", file=sys.stderr)
+            sys.exit(2)
+
+    try:
+        if cmd_line_args.compare:
+            result = diff_sysroots(cmd_line_args.sysroot, cmd_line_args.compare, cmd_line_args.target)
+        else:
+            result = compute_fingerprints(cmd_line_args.sysroot, cmd_line_args.target)
+    except Exception as e:
+        print("[ERROR] Cannot process the sysroot file")
+        print("Error message:\n" + str(e))
+        sys.exit(1)
+
+    if cmd_line_args.json:
+        print(json.dumps(result, indent=4))
+    elif cmd_line_args.compare:
+        print_diff(result)
+    else:
+        print(f"[INFO] Sysroot fingerprint: {result['sysroot']}")
+        for name, fingerprint in sorted(result['components'].items()):
+            print(f"    {name}: {fingerprint}")